@@ -0,0 +1,202 @@
+from io import BytesIO
+import argparse
+import functools
+import math
+import os
+import random
+import time
+
+from PIL import Image, ImageDraw
+
+from artwork import (SPARKLE_FILL, card_filename, get_artwork_name, get_pokemon_image, render_shining_layers,
+                     sparkle_boxes)
+from encoders import ENCODERS, write_atomic
+from instrumentation import observe_size, stage_clock
+
+ANIMATION_FORMATS = {
+    'apng': {'format': 'PNG', 'encoder': 'png'},
+    'webp': {'format': 'WEBP', 'encoder': 'webp'},
+}
+ANIMATED_DIR_NAME = 'animated'
+
+FRAME_COUNT = 12
+FRAME_DURATION = 80  # ms
+# Height of the shimmer band sweeping down the card, and its peak opacity
+SHIMMER_HEIGHT = 72
+SHIMMER_ALPHA = 70
+# Sparkles pulse between invisible and SPARKLE_FILL's alpha in this many steps
+SPARKLE_LEVELS = 4
+
+
+@functools.lru_cache(maxsize=8)
+def _shimmer_band(width, height=SHIMMER_HEIGHT, peak=SHIMMER_ALPHA):
+    """A pale gold band, opaque in the middle and fading out at its top and bottom"""
+    alpha = bytes(int(peak * math.sin(math.pi * (y + 0.5) / height)) for y in range(height))
+    band = Image.new('RGBA', (width, height), (255, 240, 180, 0))
+    band.putalpha(Image.frombytes('L', (1, height), alpha).resize((width, height), Image.NEAREST))
+    return band
+
+
+@functools.lru_cache(maxsize=64)
+def _sparkle(size, alpha):
+    sparkle = Image.new('RGBA', (size + 1, size + 1), (0, 0, 0, 0))
+    ImageDraw.Draw(sparkle).ellipse([(0, 0), (size, size)], fill=SPARKLE_FILL[:3] + (alpha,))
+    return sparkle
+
+
+def _frame_states(sparkles, frames, height, rng=random):
+    """Where the shimmer is and how bright each sparkle is, per frame
+
+    Sparkle phases come from ``rng`` so a seeded run animates the same way.
+    """
+    phases = [rng.random() for _ in sparkles]
+    states = []
+    for frame in range(frames):
+        band_top = -SHIMMER_HEIGHT + round((height + SHIMMER_HEIGHT) * frame / frames)
+        levels = tuple(
+            round(SPARKLE_LEVELS * (0.5 + 0.5 * math.cos(2 * math.pi * (frame / frames + phase))))
+            for phase in phases
+        )
+        states.append((band_top, levels))
+    return states
+
+
+def _frame_regions(state, sparkles, width, height):
+    """Rectangles the moving overlay touches in one frame"""
+    band_top, levels = state
+    regions = []
+    if band_top + SHIMMER_HEIGHT > 0 and band_top < height:
+        regions.append((0, max(0, band_top), width, min(height, band_top + SHIMMER_HEIGHT)))
+    for (x0, y0, x1, y1), level in zip(sparkles, levels):
+        if level:
+            regions.append((max(0, x0), max(0, y0), min(width, x1 + 1), min(height, y1 + 1)))
+    return [region for region in regions if region[0] < region[2] and region[1] < region[3]]
+
+
+def _composite_overlay(canvas, state, sparkles):
+    """Composite one frame's shimmer and sparkles onto ``canvas`` in place"""
+    band_top, levels = state
+    band = _shimmer_band(canvas.width)
+    if band_top + SHIMMER_HEIGHT > 0 and band_top < canvas.height:
+        source_top = max(0, -band_top)
+        canvas.alpha_composite(band, (0, max(0, band_top)), (0, source_top))
+    for (x0, y0, x1, _), level in zip(sparkles, levels):
+        if level and x0 < canvas.width and y0 < canvas.height:
+            sparkle = _sparkle(x1 - x0, SPARKLE_FILL[3] * level // SPARKLE_LEVELS)
+            canvas.alpha_composite(sparkle, (x0, y0))
+
+
+def render_animated_shining_frames(pokemon, pokemon_img=None, frames=FRAME_COUNT, duration=FRAME_DURATION,
+                                   palette=True, rng=None):
+    """Render a shining card's animation, returning ``(frames, durations)``
+
+    The card and its gold gradient are rendered once. Every frame then only
+    restores the regions the previous frame's shimmer and sparkles covered
+    and composites the new ones, so the work per frame follows the overlay
+    area rather than the card area. Consecutive identical frames are merged
+    into one longer frame and repeated states reuse the earlier frame.
+    With ``palette`` the frames share one 256 colour palette, quantized
+    region by region the same way. Sparkles are drawn from ``rng``, by
+    default the global ``random``.
+    """
+    rng = rng or random
+    clock = stage_clock()
+    static, template = render_shining_layers(pokemon, pokemon_img)
+    base = Image.alpha_composite(static, template['overlay'])
+    width, height = base.size
+    sparkles = sparkle_boxes(20, 2, 4, width, height, rng)
+    states = _frame_states(sparkles, frames, height, rng)
+    clock.mark('animation_base')
+
+    canvas = base.copy()
+    if palette:
+        # One palette for the whole animation, taken from a frame showing every overlay colour
+        sample = base.copy()
+        _composite_overlay(sample, (height // 2, (SPARKLE_LEVELS,) * len(sparkles)), sparkles)
+        shared = sample.convert('RGB').quantize(256)
+        indexed = base.convert('RGB').quantize(palette=shared, dither=Image.Dither.NONE)
+
+    output, durations, rendered = [], [], {}
+    previous_regions = []
+    for state in states:
+        if durations and rendered.get(state) is output[-1]:
+            durations[-1] += duration
+            continue
+        if state in rendered:
+            output.append(rendered[state])
+            durations.append(duration)
+            continue
+
+        regions = _frame_regions(state, sparkles, width, height)
+        for region in previous_regions:
+            canvas.paste(base.crop(region), region[:2])
+        _composite_overlay(canvas, state, sparkles)
+        if palette:
+            for region in previous_regions + regions:
+                indexed.paste(canvas.crop(region).convert('RGB').quantize(palette=shared, dither=Image.Dither.NONE),
+                              region[:2])
+            frame = indexed.copy()
+        else:
+            frame = canvas.convert('RGB')
+        previous_regions = regions
+
+        rendered[state] = frame
+        output.append(frame)
+        durations.append(duration)
+    clock.mark('animation_frames')
+    return output, durations
+
+
+def encode_animation(frames, durations, animation_format='apng'):
+    """Encode frames as an animated PNG or WebP that loops forever"""
+    spec = ANIMATION_FORMATS[animation_format]
+    buffer = BytesIO()
+    options = ENCODERS[spec['encoder']]['options']
+    frames[0].save(buffer, format=spec['format'], save_all=True, append_images=frames[1:],
+                   duration=durations, loop=0, **options)
+    observe_size('animated_encoded_bytes', buffer.tell())
+    return buffer.getvalue()
+
+
+def create_animated_shining_card(pokemon, output_dir='../../public/mons/shiny', pokemon_img=None,
+                                 frames=FRAME_COUNT, duration=FRAME_DURATION, animation_format='apng', rng=None):
+    """Render and save an animated shining card under ``output_dir``/animated"""
+    if pokemon_img is None:
+        pokemon_img = get_pokemon_image(get_artwork_name(pokemon["name"]), shiny=True)
+    # WebP builds its own palette, so only APNG frames are quantized here
+    images, durations = render_animated_shining_frames(pokemon, pokemon_img, frames, duration,
+                                                       palette=animation_format == 'apng', rng=rng)
+    clock = stage_clock()
+    data = encode_animation(images, durations, animation_format)
+    clock.mark('encode')
+
+    save_dir = os.path.join(os.path.dirname(__file__), output_dir, ANIMATED_DIR_NAME)
+    os.makedirs(save_dir, exist_ok=True)
+    save_path = os.path.join(save_dir, card_filename(pokemon, ANIMATION_FORMATS[animation_format]['encoder']))
+    write_atomic(save_path, data)
+    print(f"Animated shining card saved as {save_path} ({len(images)} frames)")
+    return save_path
+
+
+def main(argv=None):
+    from batch import card_rng
+    from populate import load_cards, shiny_dir
+
+    parser = argparse.ArgumentParser(description="Render animated shining cards")
+    parser.add_argument('--format', choices=list(ANIMATION_FORMATS), default='apng')
+    parser.add_argument('--frames', type=int, default=FRAME_COUNT)
+    parser.add_argument('--duration', type=int, default=FRAME_DURATION, help="milliseconds per frame")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default=shiny_dir)
+    args = parser.parse_args(argv)
+
+    _, shining_cards = load_cards()
+    start = time.perf_counter()
+    for pokemon in shining_cards:
+        create_animated_shining_card(pokemon, args.output_dir, frames=args.frames, duration=args.duration,
+                                     animation_format=args.format, rng=card_rng(args.seed, 'animated', pokemon['name']))
+    print(f"\nRendered {len(shining_cards)} animated cards in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+from io import BytesIO
+import hashlib
+import json
+import os
+import tarfile
+import threading
+import time
+import zipfile
+
+# Member names are paths relative to this, e.g. mons/shiny/Mew_nft.png
+PUBLIC_DIR = os.path.join(os.path.dirname(__file__), '../../public')
+# Written as the last member of every archive, and for the whole set next to them
+ARCHIVE_INDEX_NAME = 'index.json'
+ARCHIVE_FORMATS = ('tar', 'zip')
+
+
+class MemorySink:
+    """Collects ``(path, data)`` pairs, e.g. in a pool worker to be replayed into the real sink"""
+
+    def __init__(self):
+        self.entries = []
+
+    def write(self, path, data):
+        self.entries.append((path, data))
+
+
+class ArchiveSink:
+    """Streams files into a tar or zip archive, or a numbered series of them
+
+    ``path`` names the archive; its extension picks the format. With
+    ``max_bytes`` a new archive (``cards-000.tar``, ``cards-001.tar``, ...)
+    is started whenever the next file would push the current one's member
+    bytes past the cap (headers and the index come on top). Members are stored uncompressed, since the cards are already
+    compressed, so every member's bytes sit contiguously in its archive.
+    Each archive ends with an index of member offsets and sizes, and
+    ``close`` writes the index of the whole set to ``<path stem>.index.json``.
+    """
+
+    def __init__(self, path, root=PUBLIC_DIR, max_bytes=None, archive_format=None):
+        self.stem, extension = os.path.splitext(path)
+        self.archive_format = archive_format or extension.lstrip('.')
+        if self.archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format {self.archive_format!r}, expected one of {ARCHIVE_FORMATS}")
+        self.path = path
+        self.root = root
+        self.max_bytes = max_bytes
+        self.archives = []
+        self.members = {}
+        self._archive = None
+        self._archive_members = {}
+        self._archive_bytes = 0
+        self._mtime = time.time()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @property
+    def index_path(self):
+        return f"{self.stem}.{ARCHIVE_INDEX_NAME}"
+
+    def member_name(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _open_next(self):
+        if self.max_bytes:
+            path = f"{self.stem}-{len(self.archives):03d}.{self.archive_format}"
+        else:
+            path = self.path
+        self.archives.append(os.path.basename(path))
+        if self.archive_format == 'tar':
+            self._archive = tarfile.open(path, 'w', format=tarfile.PAX_FORMAT)
+        else:
+            self._archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+        self._archive_members = {}
+        self._archive_bytes = 0
+
+    def _add(self, name, data):
+        """Append one member to the open archive and return the offset of its data"""
+        if self.archive_format == 'tar':
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = self._mtime
+            self._archive.addfile(info, BytesIO(data))
+            return self._archive.offset - -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        info = zipfile.ZipInfo(name, time.localtime(self._mtime)[:6])
+        self._archive.writestr(info, data)
+        # Local file header: 30 fixed bytes, then the name and extra field
+        return info.header_offset + 30 + len(info.filename.encode('utf-8')) + len(info.extra)
+
+    def _close_archive(self):
+        self._add(ARCHIVE_INDEX_NAME, json.dumps(self._archive_members, indent=2, sort_keys=True).encode())
+        self._archive.close()
+        self._archive = None
+
+    def write(self, path, data):
+        name = self.member_name(path)
+        with self._lock:
+            if name in self.members:
+                raise ValueError(f"{name} is already in the archive")
+            if self._archive is not None and self.max_bytes and self._archive_members \
+                    and self._archive_bytes + len(data) > self.max_bytes:
+                self._close_archive()
+            if self._archive is None:
+                self._open_next()
+            entry = {
+                'offset': self._add(name, data),
+                'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }
+            self._archive_members[name] = entry
+            self._archive_bytes += len(data)
+            self.members[name] = dict(entry, archive=self.archives[-1])
+
+    def close(self):
+        with self._lock:
+            if self._archive is not None:
+                self._close_archive()
+            index = {'format': self.archive_format, 'archives': self.archives, 'members': self.members}
+            with open(self.index_path, 'w') as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+        return self.index_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_archive_index(index_path):
+    with open(index_path, 'r') as f:
+        return json.load(f)
+
+
+def read_member(index_path, name, index=None):
+    """Read one member straight from its archive using the index, without unpacking anything"""
+    index = index or load_archive_index(index_path)
+    entry = index['members'][name]
+    with open(os.path.join(os.path.dirname(index_path), entry['archive']), 'rb') as f:
+        f.seek(entry['offset'])
+        data = f.read(entry['size'])
+    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+        raise ValueError(f"{name} in {entry['archive']} does not match its index entry")
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect card archives through their offset index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    listing = subparsers.add_parser('list', help="list the members of an archive set")
+    listing.add_argument('index', metavar='INDEX', help="the .index.json written next to the archives")
+    extract = subparsers.add_parser('extract', help="copy single members out of an archive set")
+    extract.add_argument('index', metavar='INDEX')
+    extract.add_argument('names', nargs='+', metavar='NAME')
+    extract.add_argument('--output-dir', default='.')
+    args = parser.parse_args(argv)
+
+    index = load_archive_index(args.index)
+    if args.command == 'list':
+        for name, entry in sorted(index['members'].items()):
+            print(f"{entry['archive']}  {entry['offset']:>12}  {entry['size']:>10}  {name}")
+        print(f"{len(index['members'])} files in {len(index['archives'])} {index['format']} archives")
+        return
+    for name in args.names:
+        path = os.path.join(args.output_dir, name)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(read_member(args.index, name, index))
+        print(f"Extracted {name} to {path}")
+
+
+if __name__ == "__main__":
+    main()
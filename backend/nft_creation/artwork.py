@@ -1,10 +1,19 @@
-from PIL import Image, ImageDraw, ImageFont, ImageEnhance, ImageFilter
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageFont, ImageEnhance, ImageFilter
+from collections import OrderedDict
+import functools
 import random
-import requests
+import threading
 from io import BytesIO
 import math
 import os
 
+from artwork_cache import get_artwork_cache
+from derivatives import save_derivatives
+from encoders import encode_image, image_filename, write_output
+from instrumentation import count, observe_size, stage_clock
+from text_cache import draw_text, text_length
+from fonts import FONTS_DIR, HOLLOW_FONT, SOLID_FONT, TEXT_FONT, get_fonts
+
 # Pokemon card colors for different types
 TYPE_COLORS = {
     "fire": ("#FB6C6C", "#FFB7B7"),    # Red gradient
@@ -26,64 +35,128 @@ TYPE_COLORS = {
     "fairy": ("#EE99AC", "#FFD1DC")    # Light pink gradient
 }
 
-# Create fonts directory if it doesn't exist
-FONTS_DIR = os.path.join(os.path.dirname(__file__), 'fonts')
-os.makedirs(FONTS_DIR, exist_ok=True)
-
-# Pokemon font file path
-HOLLOW_FONT = os.path.join(FONTS_DIR, 'Pokemon Hollow.ttf')
-SOLID_FONT = os.path.join(FONTS_DIR, 'Pokemon Solid.ttf')
-TEXT_FONT = os.path.join(FONTS_DIR, 'ShortBaby-Mg2w.ttf')
+def _vertical_gradient(column, width):
+    """Stretch a one pixel wide column of per-row values across the card"""
+    return column.resize((width, column.height), Image.NEAREST)
 
-def get_fonts():
-    """Get the font objects for different text elements"""
-    try:
-        # Use Pokemon font with increased sizes
-        title_font = ImageFont.truetype(SOLID_FONT, 40)
-        name_font = ImageFont.truetype(SOLID_FONT, 70)
-        stats_font = ImageFont.truetype(HOLLOW_FONT, 30)
-        attack_name_font = ImageFont.truetype(HOLLOW_FONT, 50)
-        attack_damage_font = ImageFont.truetype(SOLID_FONT, 50)
-    except Exception as e:
-        print(f"Warning: Could not load Pokemon font ({str(e)}). Using system font.")
-        try:
-            # Fallback to system font
-            title_font = ImageFont.truetype('arial.ttf', 80)
-            name_font = ImageFont.truetype('arial.ttf', 65)
-            stats_font = ImageFont.truetype('arial.ttf', 50)
-            attack_name_font = ImageFont.truetype('arial.ttf', 120)
-            attack_damage_font = ImageFont.truetype('arial.ttf', 130)
-        except Exception as e:
-            print(f"Warning: Could not load system fonts ({str(e)}). Using default font.")
-            title_font = ImageFont.load_default()
-            name_font = ImageFont.load_default()
-            stats_font = ImageFont.load_default()
-            attack_name_font = ImageFont.load_default()
-            attack_damage_font = ImageFont.load_default()
-    
-    return {
-        'title': title_font,
-        'name': name_font,
-        'stats': stats_font,
-        'attack_name': attack_name_font,
-        'attack_damage': attack_damage_font
-    }
+@functools.lru_cache(maxsize=64)
+def _gradient_column(primary_color, secondary_color, height):
+    """One pixel wide RGBA column blending primary into secondary, top to bottom"""
+    channels = []
+    for p, s in zip(ImageColor.getrgb(primary_color), ImageColor.getrgb(secondary_color)):
+        rows = bytes(int(p * (1 - y / height) + s * (y / height)) for y in range(height))
+        channels.append(Image.frombytes('L', (1, height), rows))
+    return Image.merge('RGB', channels).convert('RGBA')
 
 def create_card_background(img, pokemon_type, width, height):
-    draw = ImageDraw.Draw(img)
-    
     # Get type colors for gradient
     primary_color, secondary_color = TYPE_COLORS.get(pokemon_type.lower(), ("#FFFFFF", "#EEEEEE"))
     
-    # Create a gradient background
-    for y in range(height):
-        # Calculate color for this line
-        ratio = y / height
-        r = int(int(primary_color[1:3], 16) * (1 - ratio) + int(secondary_color[1:3], 16) * ratio)
-        g = int(int(primary_color[3:5], 16) * (1 - ratio) + int(secondary_color[3:5], 16) * ratio)
-        b = int(int(primary_color[5:7], 16) * (1 - ratio) + int(secondary_color[5:7], 16) * ratio)
-        color = f"#{r:02x}{g:02x}{b:02x}"
-        draw.line([(0, y), (width, y)], fill=color)
+    # Create a gradient background: stretch a precomputed column across the
+    # card instead of drawing one line per row
+    column = _gradient_column(primary_color, secondary_color, height)
+    img.paste(_vertical_gradient(column, width), (0, 0))
+
+def create_gold_gradient(width, height):
+    """Gold overlay for shining cards, fading from the top to transparent"""
+    gold_overlay = Image.new('RGBA', (width, height), (255, 215, 0, 0))
+    alpha = bytes(int(35 * (1 - y / height)) for y in range(height))
+    gold_overlay.putalpha(_vertical_gradient(Image.frombytes('L', (1, height), alpha), width))
+    return gold_overlay
+
+@functools.lru_cache(maxsize=4)
+def _texture_grid(columns, rows, step):
+    """Mask with 255 on every ``step``-th pixel in both directions"""
+    dotted_row = (b'\xff' + bytes(step - 1)) * columns
+    grid = (dotted_row + bytes(columns * step * (step - 1))) * rows
+    return Image.frombytes('L', (columns * step, rows * step), grid)
+
+# Random bytes >= 128 become a texture point, i.e. the old random.random() > 0.5
+_TEXTURE_POINT = bytes(5 if value >= 128 else 0 for value in range(256))
+
+def _texture_points(columns, rows, rng=random):
+    return rng.randbytes(columns * rows).translate(_TEXTURE_POINT)
+
+def _texture_layer(points, columns, rows, step, width, height):
+    points = Image.frombytes('L', (columns, rows), points)
+    points = points.resize((columns * step, rows * step), Image.NEAREST)
+    alpha = ImageChops.multiply(points, _texture_grid(columns, rows, step))
+    texture = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+    texture.putalpha(alpha.crop((0, 0, width, height)))
+    return texture
+
+def create_texture_overlay(width, height, step=4, rng=random):
+    """White noise on a ``step`` pixel grid, half the points lit at alpha 5"""
+    columns = -(-width // step)
+    rows = -(-height // step)
+    return _texture_layer(_texture_points(columns, rows, rng), columns, rows, step, width, height)
+
+# Low-memory mode composites the sparkles, texture and glow into the card a
+# strip of rows at a time instead of through full-card layers. The output is
+# identical, with far less memory live at once (see benchmark.py memory).
+LOW_MEMORY = os.environ.get('POKEMON_LOW_MEMORY', '') == '1'
+STRIP_HEIGHT = 64
+# Rows of context around a strip so its blur matches the full-card blur
+_BLUR_MARGIN = 16
+
+SPARKLE_FILL = (255, 215, 0, 100)
+
+def sparkle_boxes(count, min_size, max_size, width, height, rng=random):
+    """Random sparkle bounding boxes, drawn from ``rng`` in the renderers' order"""
+    boxes = []
+    for _ in range(count):
+        x = rng.randint(0, width)
+        y = rng.randint(0, height)
+        size = rng.randint(min_size, max_size)
+        boxes.append((x, y, x + size, y + size))
+    return boxes
+
+def _draw_sparkles(layer, boxes, top=0):
+    draw = ImageDraw.Draw(layer)
+    for x0, y0, x1, y1 in boxes:
+        draw.ellipse([(x0, y0 - top), (x1, y1 - top)], fill=SPARKLE_FILL)
+
+def composite_sparkles(img, boxes, overlay=None):
+    """Composite sparkles, drawn over ``overlay`` if given, onto ``img`` in place a strip at a time"""
+    for top in range(0, img.height, STRIP_HEIGHT):
+        bottom = min(img.height, top + STRIP_HEIGHT)
+        strip_boxes = [box for box in boxes if box[1] < bottom and box[3] >= top]
+        if overlay is not None:
+            layer = overlay.crop((0, top, img.width, bottom))
+        elif strip_boxes:
+            layer = Image.new('RGBA', (img.width, bottom - top), (0, 0, 0, 0))
+        else:
+            continue
+        _draw_sparkles(layer, strip_boxes, top)
+        img.alpha_composite(layer, (0, top))
+
+def composite_texture(img, step=4, rng=random):
+    """create_texture_overlay composited onto ``img`` in place, a strip at a time"""
+    width, height = img.size
+    columns = -(-width // step)
+    rows = -(-height // step)
+    points = _texture_points(columns, rows, rng)
+    strip_rows = STRIP_HEIGHT // step
+    for row in range(0, rows, strip_rows):
+        count = min(strip_rows, rows - row)
+        layer = _texture_layer(points[row * columns:(row + count) * columns], columns, count, step,
+                               width, min(count * step, height - row * step))
+        img.alpha_composite(layer, (0, row * step))
+
+def blend_glow(img, radius=2, alpha=0.1):
+    """``Image.blend(img, img.filter(GaussianBlur(radius)), alpha)`` in place, a strip at a time"""
+    width, height = img.size
+    unblended = None  # Original pixels of the rows just above the current strip
+    for top in range(0, height, STRIP_HEIGHT):
+        bottom = min(height, top + STRIP_HEIGHT)
+        window_top = max(0, top - _BLUR_MARGIN)
+        window = img.crop((0, window_top, width, min(height, bottom + _BLUR_MARGIN)))
+        if unblended is not None:
+            window.paste(unblended, (0, 0))
+        strip = (0, top - window_top, width, bottom - window_top)
+        unblended = window.crop((0, max(0, bottom - _BLUR_MARGIN) - window_top, width, bottom - window_top))
+        glow = window.filter(ImageFilter.GaussianBlur(radius)).crop(strip)
+        img.paste(Image.blend(window.crop(strip), glow, alpha), (0, top))
 
 def create_card_frame(img, width, height):
     draw = ImageDraw.Draw(img)
@@ -137,53 +210,180 @@ def create_card_frame(img, width, height):
     #         draw.line([(i, 0), (i + 5, 0)], fill=color, width=2)
     #         draw.line([(i, height - 1), (i + 5, height - 1)], fill=color, width=2)
 
+# Bump whenever a change to the renderers alters the pixels of existing cards
+RENDERER_VERSION = "2"
+
+def card_filename(pokemon, encoder=None):
+    return image_filename(pokemon['name'], encoder)
+
+# Card dimensions (scaled up from standard size)
+CARD_WIDTH = 750  # 2.5" * 300dpi
+CARD_HEIGHT = 1050  # 3.5" * 300dpi
+
+# Attack boxes start here and stack downwards
+ATTACK_Y = 650
+ATTACK_HEIGHT = 100
+ATTACK_SPACING = 20
+
+def get_hp_bar_box(shining, width):
+    """Return (x, y, bar width, bar height) of the HP bar for a card variant"""
+    if shining:
+        # Centered above the attacks
+        hp_bar_width = 300
+        return (width - hp_bar_width) // 2, ATTACK_Y - 50, hp_bar_width, 25
+    # Top right for non-shiny cards
+    hp_bar_width = 200
+    return width - hp_bar_width - 50, 50, hp_bar_width, 25
+
+def get_attack_boxes(attack_count, width):
+    """Return the rectangle of each attack box, top to bottom"""
+    boxes = []
+    attack_y = ATTACK_Y
+    for _ in range(attack_count):
+        boxes.append([(40, attack_y), (width - 40, attack_y + ATTACK_HEIGHT)])
+        attack_y += ATTACK_HEIGHT + ATTACK_SPACING
+    return boxes
+
+# Static layers (background, frame, HP bar and attack box chrome) rendered
+# once per (type, variant, attack count) and copied as the base of each card
+TEMPLATE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_template_cache = OrderedDict()
+_template_stats = {'hits': 0, 'misses': 0, 'bytes': 0}
+_template_lock = threading.Lock()
+
+def _image_bytes(img):
+    return img.width * img.height * len(img.getbands())
+
+def _build_card_template(pokemon_type, shining, attack_count, width, height):
+    clock = stage_clock()
+    if shining:
+        # Black background, the gold gradient is applied over the finished card
+        base = Image.new("RGBA", (width, height), color="black")
+        overlay = create_gold_gradient(width, height)
+        chrome_fill, chrome_outline = "#333333", "white"
+        box_fill, box_outline = "#333333", "white"
+    else:
+        base = Image.new("RGBA", (width, height), color="white")
+        create_card_background(base, pokemon_type, width, height)
+        overlay = None
+        chrome_fill, chrome_outline = "#FFB7B7", "black"  # Light red background
+        box_outline, box_fill = TYPE_COLORS[pokemon_type.lower()]
+    clock.mark('background')
+
+    create_card_frame(base, width, height)
+    clock.mark('frame')
+    draw = ImageDraw.Draw(base)
+
+    hp_bar_x, hp_bar_y, hp_bar_width, hp_bar_height = get_hp_bar_box(shining, width)
+    hp_bar = [(hp_bar_x, hp_bar_y), (hp_bar_x + hp_bar_width, hp_bar_y + hp_bar_height)]
+    draw.rectangle(hp_bar, fill=chrome_fill, outline=chrome_outline, width=2)
+
+    attack_boxes = get_attack_boxes(attack_count, width)
+    for box in attack_boxes:
+        draw.rectangle(box, fill=box_fill, outline=box_outline, width=2)
+    clock.mark('chrome')
+
+    return {
+        'base': base,
+        'overlay': overlay,
+        # Regions drawn over anything painted before them on the card
+        'chrome': [(x0, y0, x1 + 1, y1 + 1) for (x0, y0), (x1, y1) in [hp_bar] + attack_boxes],
+        'bytes': _image_bytes(base) + (_image_bytes(overlay) if overlay else 0),
+    }
+
+def get_card_template(pokemon_type, shining, attack_count, width=CARD_WIDTH, height=CARD_HEIGHT):
+    """Return the cached static layers for a card; callers must copy before drawing"""
+    # Shining cards don't use the type colours, so every type shares one template
+    key = (None if shining else pokemon_type.lower(), shining, attack_count, width, height)
+    with _template_lock:
+        template = _template_cache.get(key)
+        if template is not None:
+            _template_cache.move_to_end(key)
+            _template_stats['hits'] += 1
+            count('template_cache_hits')
+            return template
+        _template_stats['misses'] += 1
+    count('template_cache_misses')
+
+    template = _build_card_template(pokemon_type, shining, attack_count, width, height)
+    with _template_lock:
+        if key not in _template_cache:
+            _template_cache[key] = template
+            _template_stats['bytes'] += template['bytes']
+        # Evict least recently used templates past the memory budget
+        while _template_stats['bytes'] > TEMPLATE_CACHE_MAX_BYTES and len(_template_cache) > 1:
+            _, evicted = _template_cache.popitem(last=False)
+            _template_stats['bytes'] -= evicted['bytes']
+    return template
+
+def template_cache_info():
+    """Entries, memory held and hit/miss counts of the template cache"""
+    with _template_lock:
+        return dict(_template_stats, entries=len(_template_cache), max_bytes=TEMPLATE_CACHE_MAX_BYTES)
+
+def clear_template_cache():
+    """Drop every cached template, e.g. after changing TYPE_COLORS or the frame"""
+    with _template_lock:
+        _template_cache.clear()
+        _template_stats.update(hits=0, misses=0, bytes=0)
+
+# Pass as ``pokemon_img`` to render a card without artwork instead of fetching it,
+# e.g. in a pool worker after the I/O stage's fetch failed
+NO_ARTWORK = False
+
 def get_pokemon_image(pokemon_name, shiny=False):
-    """Fetch Pokemon image from PokeAPI"""
+    """Fetch Pokemon image from PokeAPI, going through the local artwork cache"""
     try:
-        pokemon_name = pokemon_name.lower()
-        response = requests.get(f"https://pokeapi.co/api/v2/pokemon/{pokemon_name}")
-        if response.status_code == 200:
-            pokemon_data = response.json()
-            if shiny:
-                artwork_url = pokemon_data['sprites']['other']['official-artwork']['front_shiny']
-            else:
-                artwork_url = pokemon_data['sprites']['other']['official-artwork']['front_default']
-            image_response = requests.get(artwork_url)
-            if image_response.status_code == 200:
-                return Image.open(BytesIO(image_response.content))
+        content = get_artwork_cache().get_artwork(pokemon_name, shiny=shiny)
+        return Image.open(BytesIO(content))
     except Exception as e:
         print(f"Error fetching Pokemon image: {str(e)}")
     return None
 
-def create_nft_card(pokemon, output_dir='../../public/mons'):
-    # Pokemon card dimensions (scaled up from standard size)
-    width = 750  # 2.5" * 300dpi
-    height = 1050  # 3.5" * 300dpi
-    
-    # Create base image
-    img = Image.new("RGBA", (width, height), color="white")
-    
-    # Add type-based gradient background
-    create_card_background(img, pokemon["type"], width, height)
-    
-    # Add card frame
-    create_card_frame(img, width, height)
+def artwork_image(artwork_bytes):
+    """Decode fetched artwork bytes for the renderers; NO_ARTWORK when there are none"""
+    return Image.open(BytesIO(artwork_bytes)) if artwork_bytes else NO_ARTWORK
+
+def get_artwork_name(pokemon_name):
+    """Strip card prefixes so the name matches the PokeAPI species"""
+    return pokemon_name.replace("Shiny ", "").replace("Shining ", "")
+
+def encode_card(img, encoder=None):
+    """Encode a rendered card exactly as the renderers save it to disk (see encoders.py)"""
+    data = encode_image(img, encoder)
+    observe_size('encoded_bytes', len(data))
+    return data
+
+def render_nft_card(pokemon, pokemon_img=None, low_memory=None, rng=None):
+    """Render a regular card and return it as an RGB image
+
+    Sparkles and texture are drawn from ``rng``, by default the global ``random``.
+    Without ``pokemon_img`` the artwork is fetched; NO_ARTWORK leaves it out.
+    """
+    rng = rng or random
+    low_memory = LOW_MEMORY if low_memory is None else low_memory
+    clock = stage_clock()
+    width = CARD_WIDTH
+    height = CARD_HEIGHT
+    
+    # Start from the cached gradient background, frame and box chrome
+    template = get_card_template(pokemon["type"], False, len(pokemon['attacks']), width, height)
+    img = template['base'].copy()
+    clock.mark('template')
     
     # Add gold highlights and effects BEFORE adding text
-    # Gold gradient overlay
-    gold_overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-    gold_draw = ImageDraw.Draw(gold_overlay)
-    
-    
     # Add subtle gold sparkles (reduced opacity and size)
-    for _ in range(15):  # Reduced from 20 to 15
-        x = random.randint(0, width)
-        y = random.randint(0, height)
-        size = random.randint(1, 3)  # Reduced from 2-5 to 1-3
-        gold_draw.ellipse([(x, y), (x + size, y + size)], fill=(255, 215, 0, 100))  # Reduced from 150 to 100
-    
-    # Composite the gold effects onto the main image
-    img = Image.alpha_composite(img, gold_overlay)
+    sparkles = sparkle_boxes(15, 1, 3, width, height, rng)
+    if low_memory:
+        composite_sparkles(img, sparkles)
+    else:
+        # Gold gradient overlay
+        gold_overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        _draw_sparkles(gold_overlay, sparkles)
+        
+        # Composite the gold effects onto the main image
+        img = Image.alpha_composite(img, gold_overlay)
+    clock.mark('sparkles')
     
     draw = ImageDraw.Draw(img)
     
@@ -193,31 +393,25 @@ def create_nft_card(pokemon, output_dir='../../public/mons'):
     # Pokemon name and HP
     draw.text((50, 40), pokemon["name"].upper(), font=fonts['name'], fill="black")
     
+    # The HP bar and attack boxes sit on top of the sparkles and name
+    for region in template['chrome']:
+        img.paste(template['base'].crop(region), region[:2])
+    
     # HP bar in top right for non-shiny cards
     max_hp = 200
     hp_percentage = min(pokemon['hp'] / max_hp, 1.0)
-    hp_bar_width = 200
-    hp_bar_height = 25
-    hp_bar_x = width - hp_bar_width - 50
-    hp_bar_y = 50
+    hp_bar_x, hp_bar_y, hp_bar_width, hp_bar_height = get_hp_bar_box(False, width)
     
     # Draw HP text
     hp_text = f"HP {pokemon['hp']}"
-    hp_text_font = ImageFont.truetype(TEXT_FONT, 16)
-    hp_text_width = hp_text_font.getlength(hp_text)
-    draw.text(
+    hp_text_font = fonts['hp']
+    hp_text_width = text_length(hp_text_font, hp_text)
+    draw_text(
+        img,
         (hp_bar_x + (hp_bar_width - hp_text_width) // 2, hp_bar_y - 20),
         hp_text,
-        font=hp_text_font,
-        fill="#FF0000"
-    )
-    
-    # Draw HP bar background
-    draw.rectangle(
-        [(hp_bar_x, hp_bar_y), (hp_bar_x + hp_bar_width, hp_bar_y + hp_bar_height)],
-        fill="#FFB7B7",  # Light red background
-        outline="black",
-        width=2
+        hp_text_font,
+        "#FF0000"
     )
     
     # Draw HP bar fill
@@ -227,9 +421,12 @@ def create_nft_card(pokemon, output_dir='../../public/mons'):
         outline="black",
         width=2
     )
+    clock.mark('text')
     
     # Pokemon image
-    pokemon_img = get_pokemon_image(pokemon["name"])
+    if pokemon_img is None:
+        pokemon_img = get_pokemon_image(pokemon["name"])
+    clock.mark('artwork_fetch')
     if pokemon_img:
         pokemon_img = pokemon_img.convert('RGBA')
         pokemon_size = (400, 400)
@@ -247,6 +444,7 @@ def create_nft_card(pokemon, output_dir='../../public/mons'):
         # Paste shadow and image
         img.paste(shadow, (img_x, img_y), shadow)
         img.paste(pokemon_img, (img_x, img_y), pokemon_img)
+    clock.mark('resize')
     
     # Type symbol
     type_circle_center = (60, 520)
@@ -263,49 +461,40 @@ def create_nft_card(pokemon, output_dir='../../public/mons'):
     
     # Stats bar with proper font
     stats_y = 560
-    draw.text((50, stats_y), f"Attack:  {pokemon['attack']}", font=fonts['stats'], fill="black")
-    draw.text((50, stats_y + 30), f"Defense: {pokemon['defense']}", font=fonts['stats'], fill="black")
-    
-    # Attacks
-    attack_y = 650  # Define attack_y before using it
-    for attack in pokemon['attacks']:
-        # Larger attack background
-        attack_height = 100
-        draw.rectangle(
-            [(40, attack_y), (width - 40, attack_y + attack_height)],
-            fill=TYPE_COLORS[pokemon["type"].lower()][1],
-            outline=TYPE_COLORS[pokemon["type"].lower()][0],
-            width=2
-        )
-        
+    draw_text(img, (50, stats_y), f"Attack:  {pokemon['attack']}", fonts['stats'], "black")
+    draw_text(img, (50, stats_y + 30), f"Defense: {pokemon['defense']}", fonts['stats'], "black")
+    
+    # Attacks, on the larger attack backgrounds from the template
+    for attack, [(_, attack_y), _] in zip(pokemon['attacks'], get_attack_boxes(len(pokemon['attacks']), width)):
         # Attack name
-        draw.text((60, attack_y + 20), attack['name'], font=fonts['attack_name'], fill="black")
+        draw_text(img, (60, attack_y + 20), attack['name'], fonts['attack_name'], "black")
         
         # Attack damage
         damage_text = f"{attack['damage']}"
-        damage_width = fonts['attack_damage'].getlength(damage_text)
-        draw.text((width - damage_width - 60, attack_y + 20), damage_text, font=fonts['attack_damage'], fill="black")
-        
-        attack_y += attack_height + 20
+        damage_width = text_length(fonts['attack_damage'], damage_text)
+        draw_text(img, (width - damage_width - 60, attack_y + 20), damage_text, fonts['attack_damage'], "black")
+    clock.mark('text')
     
     # Add a subtle texture overlay
-    texture = Image.new('RGBA', (width, height), (255, 255, 255, 0))
-    texture_draw = ImageDraw.Draw(texture)
-    for i in range(0, width, 4):
-        for j in range(0, height, 4):
-            if random.random() > 0.5:
-                texture_draw.point((i, j), fill=(255, 255, 255, 5))
-    
-    img = Image.alpha_composite(img.convert('RGBA'), texture)
+    if low_memory:
+        composite_texture(img, rng=rng)
+    else:
+        texture = create_texture_overlay(width, height, rng=rng)
+        img = Image.alpha_composite(img, texture)
+    clock.mark('texture')
     
     # Add a subtle glow effect
-    glow = img.filter(ImageFilter.GaussianBlur(2))
-    img = Image.blend(img, glow, 0.1)
+    if low_memory:
+        blend_glow(img)
+    else:
+        glow = img.filter(ImageFilter.GaussianBlur(2))
+        img = Image.blend(img, glow, 0.1)
+    clock.mark('blur_blend')
     
     # Add description text at the bottom
     draw = ImageDraw.Draw(img)
     description = f'"{pokemon["text"]}"'  # Add quotes around the entire text
-    description_font = ImageFont.truetype(TEXT_FONT, 24)  # Increased font size
+    description_font = fonts['description']  # Increased font size
     
     # Calculate maximum width for text (accounting for card borders)
     max_width = width - 100  # Leave 50px margin on each side
@@ -317,8 +506,8 @@ def create_nft_card(pokemon, output_dir='../../public/mons'):
     line2 = ' '.join(words[mid_point:])  # Second line with closing quote
     
     # Calculate positions for both lines
-    line1_width = description_font.getlength(line1)
-    line2_width = description_font.getlength(line2)
+    line1_width = text_length(description_font, line1)
+    line2_width = text_length(description_font, line2)
     
     # Center both lines
     line1_x = (width - line1_width) // 2
@@ -331,43 +520,49 @@ def create_nft_card(pokemon, output_dir='../../public/mons'):
     # Draw both lines
     draw.text((line1_x, text_y), line1, font=description_font, fill="black")
     draw.text((line2_x, text_y + description_font.size + line_spacing), line2, font=description_font, fill="black")
+    clock.mark('text')
     
     # Convert to RGB for saving
     img = img.convert('RGB')
+    clock.mark('convert')
+    return img
+
+def create_nft_card(pokemon, output_dir='../../public/mons', pokemon_img=None, encoder=None, derivatives=None,
+                    rng=None, sink=None):
+    img = render_nft_card(pokemon, pokemon_img=pokemon_img, rng=rng)
+    clock = stage_clock()
     
-    # Ensure mons directory exists
-    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+    # Ensure mons directory exists, unless the card goes to an archive
+    if sink is None:
+        os.makedirs(os.path.dirname(output_dir), exist_ok=True)
     
     # Save image in mons directory
-    save_path = os.path.join(os.path.dirname(__file__), output_dir, f"{pokemon['name']}_nft.png")
-    img.save(save_path, quality=95)
+    save_path = os.path.join(os.path.dirname(__file__), output_dir, card_filename(pokemon, encoder))
+    data = encode_card(img, encoder)
+    clock.mark('encode')
+    write_output(save_path, data, sink)
+    clock.mark('save')
+    if derivatives:
+        # Smaller sizes come from the render still in memory, not a second pass
+        save_derivatives(img, pokemon, os.path.dirname(save_path), derivatives, encoder, sink)
+        clock.mark('derivatives')
     print(f"NFT card saved as {save_path}")
     return save_path
 
-def create_shining_card(pokemon, output_dir='../../public/mons'):
-    # Debug print to verify data
-    print(f"Creating shining card for: {pokemon['name']}")
-    print(f"Type: {pokemon['type']}")
-    print(f"HP: {pokemon['hp']}")
-    print(f"Attack: {pokemon['attack']}")
-    print(f"Defense: {pokemon['defense']}")
-    print(f"Attacks: {pokemon['attacks']}")
-    print(f"Text: {pokemon['text']}")
-    
-    # Pokemon card dimensions (scaled up from standard size)
-    width = 750  # 2.5" * 300dpi
-    height = 1050  # 3.5" * 300dpi
-    
-    # Create base image with black background
-    img = Image.new("RGBA", (width, height), color="black")
-    draw = ImageDraw.Draw(img)
-    
-    # Add card frame with silver color
-    create_card_frame(img, width, height)
-    
-       # Add gold highlights and effects BEFORE adding text
-    # Gold gradient overlay
+def render_shining_layers(pokemon, pokemon_img=None):
+    """Render the static layers of a shining card: everything under the gold gradient and sparkles
 
+    Returns the RGBA card and its template, whose ``overlay`` is the gold gradient.
+    """
+    clock = stage_clock()
+    width = CARD_WIDTH
+    height = CARD_HEIGHT
+    
+    # Start from the cached black background, frame and box chrome
+    template = get_card_template(pokemon["type"], True, len(pokemon['attacks']), width, height)
+    img = template['base'].copy()
+    draw = ImageDraw.Draw(img)
+    clock.mark('template')
     
     # Get fonts
     fonts = get_fonts()
@@ -375,34 +570,21 @@ def create_shining_card(pokemon, output_dir='../../public/mons'):
     # Pokemon name and HP
     draw.text((50, 40), pokemon["name"].upper(), font=fonts['name'], fill="white")
     
-    # Move HP bar above attacks and center it
-    attack_y = 650
-    hp_bar_y = attack_y - 50  # Position HP bar 50 pixels above attacks
-    
-    # HP bar
+    # HP bar, centered above the attacks
     max_hp = 200
     hp_percentage = min(pokemon['hp'] / max_hp, 1.0)
-    hp_bar_width = 300  # Increased width for better centering
-    hp_bar_height = 25
-    hp_bar_x = (width - hp_bar_width) // 2  # Center the bar horizontally
+    hp_bar_x, hp_bar_y, hp_bar_width, hp_bar_height = get_hp_bar_box(True, width)
     
     # Draw HP text
     hp_text = f"HP {pokemon['hp']}"
-    hp_text_font = ImageFont.truetype(TEXT_FONT, 16)
-    hp_text_width = hp_text_font.getlength(hp_text)
-    draw.text(
+    hp_text_font = fonts['hp']
+    hp_text_width = text_length(hp_text_font, hp_text)
+    draw_text(
+        img,
         (hp_bar_x + (hp_bar_width - hp_text_width) // 2, hp_bar_y - 20),
         hp_text,
-        font=hp_text_font,
-        fill="white"
-    )
-    
-    # Draw HP bar background
-    draw.rectangle(
-        [(hp_bar_x, hp_bar_y), (hp_bar_x + hp_bar_width, hp_bar_y + hp_bar_height)],
-        fill="#333333",
-        outline="white",
-        width=2
+        hp_text_font,
+        "white"
     )
     
     # Draw HP bar fill with silver color
@@ -412,10 +594,12 @@ def create_shining_card(pokemon, output_dir='../../public/mons'):
         outline="white",
         width=2
     )
+    clock.mark('text')
     
     # Pokemon image (using shiny artwork)
-    pokemon_name = pokemon["name"].replace("Shiny ", "").replace("Shining ", "")
-    pokemon_img = get_pokemon_image(pokemon_name, shiny=True)
+    if pokemon_img is None:
+        pokemon_img = get_pokemon_image(get_artwork_name(pokemon["name"]), shiny=True)
+    clock.mark('artwork_fetch')
     if pokemon_img:
         pokemon_img = pokemon_img.convert('RGBA')
         pokemon_size = (400, 400)
@@ -438,31 +622,21 @@ def create_shining_card(pokemon, output_dir='../../public/mons'):
         circle_radius = pokemon_size[0] // 2 + 10
         circle_center_x = img_x + pokemon_size[0] // 2
         circle_center_y = img_y + pokemon_size[1] // 2
-        
+    clock.mark('resize')
     
-    # Attacks
-    for attack in pokemon['attacks']:
-        attack_height = 100
-        draw.rectangle(
-            [(40, attack_y), (width - 40, attack_y + attack_height)],
-            fill="#333333",
-            outline="white",
-            width=2
-        )
-        
+    # Attacks, on the attack boxes from the template
+    for attack, [(_, attack_y), _] in zip(pokemon['attacks'], get_attack_boxes(len(pokemon['attacks']), width)):
         # Attack name
-        draw.text((60, attack_y + 20), attack['name'], font=fonts['attack_name'], fill="white")
+        draw_text(img, (60, attack_y + 20), attack['name'], fonts['attack_name'], "white")
         
         # Attack damage
         damage_text = f"{attack['damage']}"
-        damage_width = fonts['attack_damage'].getlength(damage_text)
-        draw.text((width - damage_width - 60, attack_y + 20), damage_text, font=fonts['attack_damage'], fill="white")
-        
-        attack_y += attack_height + 20
+        damage_width = text_length(fonts['attack_damage'], damage_text)
+        draw_text(img, (width - damage_width - 60, attack_y + 20), damage_text, fonts['attack_damage'], "white")
     
     # Add description text at the bottom
     description = f'"{pokemon["text"]}"'
-    description_font = ImageFont.truetype(TEXT_FONT, 24)
+    description_font = fonts['description']
     
     # Split text into two lines
     words = description.split()
@@ -471,8 +645,8 @@ def create_shining_card(pokemon, output_dir='../../public/mons'):
     line2 = ' '.join(words[mid_point:])
     
     # Calculate positions for both lines
-    line1_width = description_font.getlength(line1)
-    line2_width = description_font.getlength(line2)
+    line1_width = text_length(description_font, line1)
+    line2_width = text_length(description_font, line2)
     
     # Center both lines
     line1_x = (width - line1_width) // 2
@@ -485,37 +659,72 @@ def create_shining_card(pokemon, output_dir='../../public/mons'):
     # Draw both lines
     draw.text((line1_x, text_y), line1, font=description_font, fill="white")
     draw.text((line2_x, text_y + description_font.size + line_spacing), line2, font=description_font, fill="white")
-    
-    gold_overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-    gold_draw = ImageDraw.Draw(gold_overlay)
-    
-    # Add subtle gold gradient from top to bottom (reduced opacity)
-    for y in range(height):
-        alpha = int(35 * (1 - y/height))  # Reduced from 30 to 20
-        gold_draw.line([(0, y), (width, y)], fill=(255, 215, 0, alpha))
-    
+    clock.mark('text')
+    return img, template
 
-    
-    # Add subtle gold sparkles (reduced opacity and size)
-    for _ in range(20):  # Reduced from 20 to 15
-        x = random.randint(0, width)
-        y = random.randint(0, height)
-        size = random.randint(2, 4)  # Reduced from 2-5 to 1-3
-        gold_draw.ellipse([(x, y), (x + size, y + size)], fill=(255, 215, 0, 100))  # Reduced from 150 to 100
-    
-    # Composite the gold effects onto the main image
-    img = Image.alpha_composite(img, gold_overlay)
+def render_shining_card(pokemon, pokemon_img=None, low_memory=None, rng=None):
+    """Render a shining card and return it as an RGB image, its sparkles drawn from ``rng``"""
+    low_memory = LOW_MEMORY if low_memory is None else low_memory
+    img, template = render_shining_layers(pokemon, pokemon_img)
+    clock = stage_clock()
+    width, height = img.size
+    
+    # Add subtle gold sparkles (reduced opacity and size) over the gold gradient
+    sparkles = sparkle_boxes(20, 2, 4, width, height, rng or random)
+    if low_memory:
+        composite_sparkles(img, sparkles, template['overlay'])
+    else:
+        # Add subtle gold gradient from top to bottom (reduced opacity)
+        gold_overlay = template['overlay'].copy()
+        _draw_sparkles(gold_overlay, sparkles)
+        
+        # Composite the gold effects onto the main image
+        img = Image.alpha_composite(img, gold_overlay)
+    clock.mark('sparkles')
     
     # Convert to RGB for saving
     img = img.convert('RGB')
+    clock.mark('convert')
+    return img
+
+def create_shining_card(pokemon, output_dir='../../public/mons', pokemon_img=None, encoder=None, derivatives=None,
+                        rng=None, sink=None):
+    # Debug print to verify data
+    print(f"Creating shining card for: {pokemon['name']}")
+    print(f"Type: {pokemon['type']}")
+    print(f"HP: {pokemon['hp']}")
+    print(f"Attack: {pokemon['attack']}")
+    print(f"Defense: {pokemon['defense']}")
+    print(f"Attacks: {pokemon['attacks']}")
+    print(f"Text: {pokemon['text']}")
+    
+    img = render_shining_card(pokemon, pokemon_img=pokemon_img, rng=rng)
+    clock = stage_clock()
     
-    # Ensure mons directory exists
-    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+    # Ensure mons directory exists, unless the card goes to an archive
+    if sink is None:
+        os.makedirs(os.path.dirname(output_dir), exist_ok=True)
     
     # Save image in mons directory
-    save_path = os.path.join(os.path.dirname(__file__), output_dir, f"{pokemon['name']}_nft.png")
-    img.save(save_path, quality=95)
+    save_path = os.path.join(os.path.dirname(__file__), output_dir, card_filename(pokemon, encoder))
+    data = encode_card(img, encoder)
+    clock.mark('encode')
+    write_output(save_path, data, sink)
+    clock.mark('save')
+    if derivatives:
+        # Smaller sizes come from the render still in memory, not a second pass
+        save_derivatives(img, pokemon, os.path.dirname(save_path), derivatives, encoder, sink)
+        clock.mark('derivatives')
     print(f"Shining NFT card saved as {save_path}")
     return save_path
 
 
+
+def render_card_bytes(pokemon, shining=False, pokemon_img=None, encoder=None, rng=None):
+    """Render a card and return the encoded image bytes without touching the disk"""
+    render = render_shining_card if shining else render_nft_card
+    img = render(pokemon, pokemon_img=pokemon_img, rng=rng)
+    clock = stage_clock()
+    data = encode_card(img, encoder)
+    clock.mark('encode')
+    return data
@@ -0,0 +1,304 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+from instrumentation import count, observe_size
+
+# Where cached PokeAPI responses live. Override with POKEMON_ARTWORK_CACHE.
+CACHE_DIR = os.environ.get(
+    'POKEMON_ARTWORK_CACHE',
+    os.path.join(os.path.dirname(__file__), '.artwork_cache')
+)
+CACHE_MAX_BYTES = int(os.environ.get('POKEMON_ARTWORK_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Entries younger than this are served without touching the network
+CACHE_MAX_AGE = int(os.environ.get('POKEMON_ARTWORK_CACHE_MAX_AGE', 7 * 24 * 3600))
+OFFLINE = os.environ.get('POKEMON_OFFLINE', '') == '1'
+
+POKEAPI_URL = os.environ.get('POKEAPI_URL', 'https://pokeapi.co/api/v2/pokemon/{name}')
+REQUEST_TIMEOUT = 10
+# Downloads between index writes; the rest are flushed after each prefetch and batch, and at exit
+FLUSH_EVERY = 256
+# A hit only refreshes an entry's last use once it is this stale, so reads rarely dirty the index
+TOUCH_INTERVAL = 3600
+
+
+class OfflineCacheMiss(Exception):
+    """Raised when offline mode is on and the cache cannot answer a request"""
+
+
+def species_key(pokemon_name):
+    return f"species:{pokemon_name.lower()}"
+
+
+def artwork_key(pokemon_name, shiny=False):
+    return f"artwork:{pokemon_name.lower()}:{'shiny' if shiny else 'default'}"
+
+
+class ArtworkCache:
+    """Content-addressed disk cache for species JSON and artwork bytes.
+
+    Blobs are stored under their sha256 so identical payloads are kept once.
+    ``index.json`` maps a cache key to the blob plus the validators needed
+    for conditional requests, and the least recently used entries are
+    evicted once the blobs exceed ``max_bytes``. The index is kept in
+    memory and written every ``FLUSH_EVERY`` downloads and on ``flush``,
+    so filling the cache doesn't rewrite it once per entry.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE,
+                 offline=OFFLINE, api_url=POKEAPI_URL, session=None, timeout=REQUEST_TIMEOUT, species_index=None):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = offline
+        self.api_url = api_url
+        self._session = session
+        self.timeout = timeout
+        # None uses the imported species index if there is one; False never does
+        self._species_index = species_index
+        self.network_calls = 0
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._unflushed = 0
+        self._index = self._load_index()
+        # Entries per blob and the blobs' total size, kept up to date as entries come and go
+        self._blob_refs = {}
+        self._total_bytes = 0
+        for entry in self._index.values():
+            self._ref_blob(entry)
+
+    @property
+    def session(self):
+        # requests is slow to import, so only pay for it once something is downloaded
+        with self._lock:
+            if self._session is None:
+                import requests
+                self._session = requests.Session()
+            return self._session
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def flush(self):
+        """Write the index to disk if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+            self._unflushed = 0
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _read_blob(self, entry):
+        try:
+            with open(self._blob_path(entry['sha256']), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_blob(self, content):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return digest
+
+    def _ref_blob(self, entry):
+        refs = self._blob_refs.get(entry['sha256'], 0)
+        if not refs:
+            self._total_bytes += entry['size']
+        self._blob_refs[entry['sha256']] = refs + 1
+
+    def _unref_blob(self, entry):
+        """Drop one reference to an entry's blob and return True if it was the last"""
+        refs = self._blob_refs.pop(entry['sha256']) - 1
+        if refs:
+            self._blob_refs[entry['sha256']] = refs
+            return False
+        self._total_bytes -= entry['size']
+        return True
+
+    def total_bytes(self):
+        with self._lock:
+            return self._total_bytes
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['last_used']):
+            if self._total_bytes <= self.max_bytes:
+                break
+            del self._index[key]
+            if self._unref_blob(entry):
+                try:
+                    os.remove(self._blob_path(entry['sha256']))
+                except OSError:
+                    pass
+        self._dirty = True
+
+    def lookup(self, key, url):
+        """Return the cached bytes for ``url`` if they can be served without the network"""
+        with self._lock:
+            entry = self._index.get(key)
+            if not entry or entry['url'] != url:
+                return None
+            if not self.offline and time.time() - entry['fetched'] >= self.max_age:
+                return None
+            content = self._read_blob(entry)
+            if content is not None:
+                now = time.time()
+                if now - entry['last_used'] >= TOUCH_INTERVAL:
+                    entry['last_used'] = now
+                    self._dirty = True
+                count('artwork_cache_hits')
+            return content
+
+    def get(self, key, url, timeout=None):
+        """Return the bytes for ``url``, serving from and updating the cache"""
+        content = self.lookup(key, url)
+        if content is not None:
+            return content
+        with self._lock:
+            entry = self._index.get(key)
+            content = self._read_blob(entry) if entry and entry['url'] == url else None
+            if content is None and self.offline:
+                count('artwork_cache_offline_misses')
+                raise OfflineCacheMiss(f"{key} is not cached")
+            self.network_calls += 1
+        count('artwork_cache_misses')
+
+        headers = {}
+        if content is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+
+        with self._lock:
+            if response.status_code == 304 and content is not None:
+                now = time.time()
+                entry['fetched'] = now
+                entry['last_used'] = now
+                self._dirty = True
+                count('artwork_cache_revalidated')
+                return content
+            response.raise_for_status()
+        observe_size('artwork_download_bytes', len(response.content))
+        return self.put(key, url, response.content, etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'))
+
+    def put(self, key, url, content, etag=None, last_modified=None):
+        """Store ``content`` as the cached response for ``url``"""
+        now = time.time()
+        with self._lock:
+            digest = self._write_blob(content)
+            previous = self._index.get(key)
+            if previous is not None:
+                self._unref_blob(previous)
+            self._index[key] = entry = {
+                'url': url,
+                'sha256': digest,
+                'size': len(content),
+                'etag': etag,
+                'last_modified': last_modified,
+                'fetched': now,
+                'last_used': now,
+            }
+            self._ref_blob(entry)
+            self._dirty = True
+            self._unflushed += 1
+            self._evict()
+            if self._unflushed >= FLUSH_EVERY:
+                self.flush()
+        return content
+
+    def get_species(self, pokemon_name):
+        """Return the parsed PokeAPI species JSON for a Pokemon"""
+        pokemon_name = pokemon_name.lower()
+        url = self.api_url.format(name=pokemon_name)
+        return json.loads(self.get(species_key(pokemon_name), url))
+
+    @property
+    def species_index(self):
+        if self._species_index is None:
+            from species_index import get_species_index
+            return get_species_index()
+        return self._species_index or None
+
+    def resolve_artwork(self, pokemon_name, shiny=False):
+        """``(url, local path)`` of a Pokemon's artwork from the species index, or None"""
+        species_index = self.species_index
+        return species_index.artwork(pokemon_name, shiny) if species_index is not None else None
+
+    def read_local_artwork(self, path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        count('species_index_local_hits')
+        return content
+
+    def get_artwork(self, pokemon_name, shiny=False):
+        """Return the official artwork PNG bytes for a Pokemon"""
+        # Indexed species skip the per-card species request, and local files skip the network entirely
+        resolved = self.resolve_artwork(pokemon_name, shiny)
+        if resolved is not None:
+            url, path = resolved
+            if path:
+                return self.read_local_artwork(path)
+            return self.get(artwork_key(pokemon_name, shiny), url)
+
+        pokemon_data = self.get_species(pokemon_name)
+        artwork = pokemon_data['sprites']['other']['official-artwork']
+        artwork_url = artwork['front_shiny'] if shiny else artwork['front_default']
+        return self.get(artwork_key(pokemon_name, shiny), artwork_url)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_artwork_cache():
+    """Return the process-wide cache, creating it on first use"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ArtworkCache()
+        return _default_cache
+
+
+def _flush_default_cache():
+    if _default_cache is not None:
+        _default_cache.flush()
+
+
+atexit.register(_flush_default_cache)
+
+
+def set_artwork_cache(cache):
+    """Replace the process-wide cache (e.g. to point at a stub server or go offline)"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is not None:
+            _default_cache.flush()
+        _default_cache = cache
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+
+from PIL import Image
+
+from encoders import ENCODERS, encode_image, get_encoder, image_extensions, write_atomic
+from journal import file_sha256
+
+# Longest side of a sprite sheet; 2048 is safe for every browser and GPU
+ATLAS_MAX_SIZE = 2048
+ATLAS_DIR_NAME = 'atlas'
+ATLAS_INDEX_NAME = 'atlas.json'
+
+
+def card_images(source_dir):
+    """Return {card name: path} for the card images directly in ``source_dir``"""
+    suffixes = tuple(f"_nft.{extension}" for extension in image_extensions())
+    cards = {}
+    for item in sorted(os.listdir(source_dir)):
+        path = os.path.join(source_dir, item)
+        if item.endswith(suffixes) and os.path.isfile(path):
+            cards[item[:item.rindex('_nft.')]] = path
+    return cards
+
+
+def load_index(atlas_dir):
+    try:
+        with open(os.path.join(atlas_dir, ATLAS_INDEX_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _grid(card_size, max_size):
+    """Columns and rows of same-sized cards that fit on one sheet"""
+    width, height = card_size
+    return max(1, max_size // width), max(1, max_size // height)
+
+
+def build_atlas(source_dir, atlas_dir=None, max_size=ATLAS_MAX_SIZE, encoder=None, repack=False):
+    """Pack the cards in ``source_dir`` into sprite sheets and write a JSON index
+
+    Cards of the same size share a grid of slots, so each keeps its sheet
+    and rectangle between runs. Only sheets holding a card that was added,
+    changed or removed are redrawn; the rest are left untouched on disk.
+    ``repack`` throws the old layout away and packs every card afresh.
+    Returns the index. Raises FileNotFoundError if ``source_dir`` doesn't exist.
+    """
+    if not os.path.isdir(source_dir):
+        raise FileNotFoundError(f"No card directory {source_dir}")
+    atlas_dir = atlas_dir or os.path.join(source_dir, ATLAS_DIR_NAME)
+    os.makedirs(atlas_dir, exist_ok=True)
+    spec = get_encoder(encoder)
+    encoder = encoder or 'png'
+    cards = card_images(source_dir)
+
+    index = load_index(atlas_dir)
+    if repack or not index or index.get('max_size') != max_size or index.get('encoder') != encoder:
+        index = {'max_size': max_size, 'encoder': encoder, 'sheets': {}, 'cards': {}}
+    old_sheets = set(index['sheets'])
+    dirty = set()
+
+    # Drop cards that are gone or changed size; changed pixels only dirty their sheet
+    hashes = {name: file_sha256(path) for name, path in cards.items()}
+    sizes = {}
+    for name, entry in list(index['cards'].items()):
+        if name in cards:
+            with Image.open(cards[name]) as img:
+                sizes[name] = img.size
+            if sizes[name] == (entry['w'], entry['h']):
+                if hashes[name] != entry['sha256']:
+                    entry['sha256'] = hashes[name]
+                    dirty.add(entry['sheet'])
+                continue
+        del index['cards'][name]
+        dirty.add(entry['sheet'])
+
+    # New cards take the first free slot on a sheet of their size
+    used = {(entry['sheet'], entry['slot']) for entry in index['cards'].values()}
+    for name, path in cards.items():
+        if name in index['cards']:
+            continue
+        if name not in sizes:
+            with Image.open(path) as img:
+                sizes[name] = img.size
+        width, height = sizes[name]
+        columns, rows = _grid(sizes[name], max_size)
+        sheet_number = 0
+        while True:
+            sheet = f"atlas_{width}x{height}_{sheet_number}.{spec['extension']}"
+            free = [slot for slot in range(columns * rows) if (sheet, slot) not in used]
+            if free:
+                break
+            sheet_number += 1
+        slot = free[0]
+        used.add((sheet, slot))
+        index['cards'][name] = {
+            'sheet': sheet, 'slot': slot, 'sha256': hashes[name],
+            'x': slot % columns * width, 'y': slot // columns * height, 'w': width, 'h': height,
+        }
+        dirty.add(sheet)
+
+    members = {}
+    for name, entry in index['cards'].items():
+        members.setdefault(entry['sheet'], []).append(name)
+    for sheet in dirty | (old_sheets - set(members)):
+        path = os.path.join(atlas_dir, sheet)
+        if sheet not in members:
+            index['sheets'].pop(sheet, None)
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        entries = [index['cards'][name] for name in members[sheet]]
+        columns, _ = _grid((entries[0]['w'], entries[0]['h']), max_size)
+        last_row = max(entry['slot'] for entry in entries) // columns
+        atlas = Image.new('RGBA', (columns * entries[0]['w'], (last_row + 1) * entries[0]['h']), (0, 0, 0, 0))
+        for name, entry in zip(members[sheet], entries):
+            with Image.open(cards[name]) as img:
+                atlas.paste(img.convert('RGBA'), (entry['x'], entry['y']))
+        write_atomic(path, encode_image(atlas, encoder))
+        index['sheets'][sheet] = {'width': atlas.width, 'height': atlas.height, 'cards': len(entries)}
+
+    write_atomic(os.path.join(atlas_dir, ATLAS_INDEX_NAME), json.dumps(index, indent=2, sort_keys=True).encode())
+    print(f"Packed {len(index['cards'])} cards into {len(index['sheets'])} sheets in {atlas_dir} "
+          f"({len(dirty)} redrawn)")
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack rendered cards into sprite sheets with a JSON index")
+    parser.add_argument('source_dirs', nargs='+', metavar='DIR',
+                        help="directories of card images, e.g. public/mons/thumbnail")
+    parser.add_argument('--max-size', type=int, default=ATLAS_MAX_SIZE, help="longest side of a sheet")
+    parser.add_argument('--encoder', choices=list(ENCODERS), default='png')
+    parser.add_argument('--repack', action='store_true', help="ignore the previous layout and pack from scratch")
+    args = parser.parse_args(argv)
+
+    for source_dir in args.source_dirs:
+        if not os.path.isdir(source_dir):
+            parser.error(f"no card directory {source_dir}")
+    for source_dir in args.source_dirs:
+        build_atlas(source_dir, max_size=args.max_size, encoder=args.encoder, repack=args.repack)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import os
+import random
+import time
+
+from archive import MemorySink
+from artwork import (CARD_HEIGHT, CARD_WIDTH, artwork_image, card_filename, create_nft_card, create_shining_card,
+                     get_artwork_name)
+from artwork_cache import get_artwork_cache
+from derivatives import derivative_path, remove_stale_derivatives, save_size_manifest, size_manifest_entry
+from fonts import preload_fonts
+import instrumentation
+from manifest import MANIFEST_NAME, card_fingerprint, load_manifest, remove_orphans, save_manifest, shard_manifest_name
+
+RENDERERS = {
+    'regular': create_nft_card,
+    'shining': create_shining_card,
+}
+
+
+def card_seed(seed, kind, pokemon_name):
+    """Per-card seed so a card renders the same no matter which worker picks it up"""
+    return f"{seed}:{kind}:{pokemon_name}"
+
+
+def card_rng(seed, kind, pokemon_name):
+    """A private ``random.Random`` for one card, independent of the global ``random`` and of other cards"""
+    return random.Random(card_seed(seed, kind, pokemon_name))
+
+
+def fetch_artwork(kind, pokemon):
+    """I/O stage: download (or read from cache) the artwork bytes for one card"""
+    shiny = kind == 'shining'
+    pokemon_name = get_artwork_name(pokemon['name']) if shiny else pokemon['name']
+    return get_artwork_cache().get_artwork(pokemon_name, shiny=shiny)
+
+
+def render_card(kind, pokemon, output_dir, artwork_bytes=None, seed=0, encoder=None, derivatives=None, sink=None):
+    """CPU stage: composite and save (or hand to ``sink``) one card. Runs inside a pool worker."""
+    start = time.perf_counter()
+    pokemon_img = artwork_image(artwork_bytes)
+    path = RENDERERS[kind](pokemon, output_dir=output_dir, pokemon_img=pokemon_img, encoder=encoder,
+                           derivatives=derivatives, rng=card_rng(seed, kind, pokemon['name']), sink=sink)
+    return path, time.perf_counter() - start
+
+
+def _init_worker(instrumented):
+    preload_fonts()
+    if instrumented:
+        instrumentation.enable()
+
+
+def _run_in_worker(render_fn, *args, collect=False):
+    """Run ``render_fn`` in a pool worker and ship the worker's metrics back with its result
+
+    With ``collect`` the files it writes are kept in memory and shipped back
+    too, for the parent to pass on to its sink.
+    """
+    sink = MemorySink() if collect else None
+    result = render_fn(*args, sink=sink) if collect else render_fn(*args)
+    registry = instrumentation.get_registry()
+    return result, registry.drain() if registry is not None else None, sink.entries if collect else None
+
+
+def render_batch(jobs, workers=None, io_workers=8, seed=0, incremental=False, render_fn=render_card,
+                 artwork=None, encoder=None, derivatives=None, shard=None, journal=None, retries=0,
+                 retry_backoff=1.0, sink=None):
+    """Render ``(kind, pokemon, output_dir)`` jobs and return one result dict per card.
+
+    Artwork is fetched on a thread pool and each card is handed to the
+    process pool as soon as its artwork arrives, so downloads overlap with
+    compositing. Each card draws its sparkles and texture from its own
+    generator seeded with ``seed`` and the card's kind and name, so a card
+    comes out byte-identical whichever worker, process or machine renders it.
+
+    Every output directory gets a manifest of card fingerprints, kept in its
+    state directory (see render_state.py). With ``incremental`` set, cards
+    whose fingerprint is unchanged are skipped and images that no job
+    produces any more are deleted.
+
+    ``render_fn`` replaces ``render_card`` as the per-card worker; it must
+    take the same arguments, return ``(path, seconds)`` and be picklable.
+
+    ``encoder`` names the output format (see encoders.py). ``derivatives``
+    maps size names to widths; each card is also written at those sizes and
+    every output directory gets a size manifest of the variants.
+
+    ``artwork`` maps ``(kind, name)`` to artwork bytes fetched ahead of time
+    (see prefetch.py); cards missing from it are fetched as usual.
+
+    ``shard`` is ``(index, count)`` when ``jobs`` are one shard of a deck
+    (see shards.py). Fingerprints then go to that shard's partial manifest
+    and no images are removed, since other shards' cards may share the
+    directories.
+
+    ``journal`` is a ProgressJournal (see journal.py) that records every
+    card as it starts, finishes or fails, so a run that dies can be resumed.
+    Cards the journal shows finished with unchanged inputs and an intact
+    image are skipped; cards skipped as up to date by the manifest are
+    journaled as done too. Cards that fail, or render without their artwork,
+    are retried up to ``retries`` more times, waiting ``retry_backoff``
+    seconds before the first retry and twice as long before each next one.
+
+    ``sink`` (see archive.py) receives every file instead of the disk;
+    ``render_fn`` must then take a ``sink`` keyword. Pool workers hand their
+    files back to this process, which writes them to the sink in completion
+    order. Nothing is on disk to compare against, so ``incremental`` and
+    ``journal`` don't apply and no manifests are written.
+    """
+    if sink is not None and (incremental or journal is not None):
+        raise ValueError("incremental and journaled runs need the cards on disk, not in a sink")
+    workers = workers or os.cpu_count() or 1
+    outcomes = {}
+    start = time.perf_counter()
+    output_dirs = {output_dir for _, _, output_dir in jobs}
+    manifest_name = shard_manifest_name(*shard) if shard else MANIFEST_NAME
+    old_manifests = {output_dir: load_manifest(output_dir, manifest_name) for output_dir in output_dirs}
+    new_manifests = {output_dir: {} for output_dir in output_dirs}
+
+    def record(kind, pokemon, path=None, seconds=None, error=None, fetch_error=None, skipped=False,
+               fingerprint=None):
+        previous = outcomes.get((kind, pokemon['name']))
+        if error:
+            print(f"Failed to render {kind} card {pokemon['name']}: {error}")
+            if journal is not None:
+                journal.failed(kind, pokemon['name'], error)
+            if previous and previous['path']:
+                # A retry failed; keep the card the earlier attempt rendered without its artwork
+                return previous
+        elif journal is not None and skipped != 'journal':
+            # Cards skipped on the manifest's word are journaled too, so the journal covers the whole run
+            journal.done(kind, pokemon['name'], path, fingerprint, fetch_error)
+        result = {
+            'kind': kind,
+            'name': pokemon['name'],
+            'path': path,
+            'seconds': seconds,
+            'error': error,
+            'fetch_error': fetch_error,
+            'skipped': bool(skipped),
+        }
+        outcomes[(kind, pokemon['name'])] = result
+        return result
+
+    def fetch(kind, pokemon):
+        if artwork is not None and (kind, pokemon['name']) in artwork:
+            return artwork[(kind, pokemon['name'])]
+        return fetch_artwork(kind, pokemon)
+
+    def up_to_date(output_dir, filename, fingerprint, kind, pokemon):
+        """'journal' or 'manifest' when the card can be skipped, after whichever says it is current"""
+        path = os.path.join(output_dir, filename)
+        # The fingerprint covers the requested sizes, but a deleted derivative still needs rendering
+        if not all(os.path.isfile(derivative_path(output_dir, name, pokemon, encoder)) for name in derivatives or ()):
+            return None
+        if journal is not None and journal.completed(kind, pokemon['name'], path, fingerprint):
+            return 'journal'
+        if incremental and old_manifests[output_dir].get(filename) == fingerprint and os.path.isfile(path):
+            return 'manifest'
+        return None
+
+    def needs_retry(kind, pokemon, _):
+        outcome = outcomes[(kind, pokemon['name'])]
+        return outcome['error'] or outcome['fetch_error']
+
+    registry = instrumentation.get_registry()
+    render_pool = None
+    if workers > 1:
+        # Workers collect into their own registry, merged back here card by card
+        render_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                          initargs=(registry is not None,))
+    try:
+        with ThreadPoolExecutor(max_workers=io_workers) as io_pool:
+            pending = list(jobs)
+            for attempt in range(1, retries + 2):
+                if attempt > 1:
+                    delay = retry_backoff * 2 ** (attempt - 2)
+                    print(f"\nRetrying {len(pending)} failed cards in {delay:.1f}s "
+                          f"(attempt {attempt} of {retries + 1})")
+                    time.sleep(delay)
+                fetches = {
+                    io_pool.submit(fetch, kind, pokemon): (kind, pokemon, output_dir)
+                    for kind, pokemon, output_dir in pending
+                }
+                renders = {}
+                for fetch_future in as_completed(fetches):
+                    kind, pokemon, output_dir = fetches[fetch_future]
+                    try:
+                        artwork_bytes, fetch_error = fetch_future.result(), None
+                    except Exception as e:
+                        # Render without artwork (NO_ARTWORK), so the worker never fetches it itself
+                        artwork_bytes, fetch_error = None, str(e)
+                        print(f"Error fetching Pokemon image for {pokemon['name']}: {fetch_error}")
+
+                    filename = card_filename(pokemon, encoder)
+                    fingerprint = card_fingerprint(kind, pokemon, artwork_bytes, seed, encoder, derivatives)
+                    skipped = up_to_date(output_dir, filename, fingerprint, kind, pokemon)
+                    if skipped:
+                        new_manifests[output_dir][filename] = fingerprint
+                        record(kind, pokemon, os.path.join(output_dir, filename), fetch_error=fetch_error,
+                               skipped=skipped, fingerprint=fingerprint)
+                        continue
+                    if journal is not None:
+                        journal.start(kind, pokemon['name'], attempt)
+                    if render_pool is None:
+                        try:
+                            args = (kind, pokemon, output_dir, artwork_bytes, seed, encoder, derivatives)
+                            path, seconds = render_fn(*args, sink=sink) if sink is not None else render_fn(*args)
+                            new_manifests[output_dir][filename] = fingerprint
+                            record(kind, pokemon, path, seconds, fetch_error=fetch_error, fingerprint=fingerprint)
+                        except Exception as e:
+                            record(kind, pokemon, error=str(e), fetch_error=fetch_error)
+                    else:
+                        render = render_pool.submit(_run_in_worker, render_fn, kind, pokemon, output_dir,
+                                                    artwork_bytes, seed, encoder, derivatives,
+                                                    collect=sink is not None)
+                        renders[render] = (kind, pokemon, output_dir, filename, fingerprint, fetch_error)
+
+                for render in as_completed(renders):
+                    kind, pokemon, output_dir, filename, fingerprint, fetch_error = renders[render]
+                    try:
+                        (path, seconds), snapshot, entries = render.result()
+                        if snapshot is not None and registry is not None:
+                            registry.merge(snapshot)
+                        for entry_path, data in entries or ():
+                            sink.write(entry_path, data)
+                        new_manifests[output_dir][filename] = fingerprint
+                        record(kind, pokemon, path, seconds, fetch_error=fetch_error, fingerprint=fingerprint)
+                    except Exception as e:
+                        record(kind, pokemon, error=str(e), fetch_error=fetch_error)
+
+                pending = [job for job in pending if needs_retry(*job)]
+                if not pending:
+                    break
+    finally:
+        if render_pool is not None:
+            render_pool.shutdown()
+        # The cache batches its index writes; persist what this run downloaded
+        get_artwork_cache().flush()
+    results = list(outcomes.values())
+
+    # Cards in a sink have nothing on disk for a manifest to describe
+    if sink is None:
+        for output_dir, entries in new_manifests.items():
+            if incremental and not shard:
+                expected = {card_filename(pokemon, encoder) for _, pokemon, job_dir in jobs if job_dir == output_dir}
+                for directory in [output_dir, *(os.path.join(output_dir, name) for name in derivatives or ())]:
+                    if os.path.isdir(directory):
+                        for path in remove_orphans(directory, expected):
+                            print(f"Removed orphaned card {path}")
+                # Sizes an earlier run wrote but this one doesn't would no longer match the cards
+                for path in remove_stale_derivatives(output_dir, derivatives or ()):
+                    print(f"Removed stale derivative {path}")
+            save_manifest(output_dir, entries, manifest_name)
+
+    # Sharded runs leave the size manifests to the merge, which sees every card
+    if derivatives and not shard and sink is None:
+        sizes = {output_dir: {} for output_dir in output_dirs}
+        job_cards = {(kind, pokemon['name']): (pokemon, output_dir) for kind, pokemon, output_dir in jobs}
+        for result in results:
+            if result['path']:
+                pokemon, output_dir = job_cards[(result['kind'], result['name'])]
+                sizes[output_dir][pokemon['name']] = size_manifest_entry(
+                    pokemon, output_dir, (CARD_WIDTH, CARD_HEIGHT), derivatives, encoder)
+        for output_dir, entries in sizes.items():
+            save_size_manifest(output_dir, entries)
+
+    elapsed = time.perf_counter() - start
+    skipped = sum(1 for result in results if result['skipped'])
+    failed_count = sum(1 for result in results if result['error'])
+    rendered = len(results) - skipped - failed_count
+    without_artwork = sum(1 for result in results if result['fetch_error'] and not result['error'])
+    rate = rendered / elapsed if elapsed > 0 else 0.0
+    print(f"\nRendered {rendered} cards in {elapsed:.2f}s ({rate:.2f} cards/s, {workers} workers)")
+    if skipped:
+        print(f"{skipped} cards were up to date")
+    if without_artwork:
+        print(f"{without_artwork} cards have no artwork because fetching it failed")
+    if failed_count:
+        print(f"{failed_count} cards failed")
+    return results
@@ -0,0 +1,392 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from io import BytesIO, StringIO
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import PIL
+from PIL import Image, ImageDraw
+
+from artwork import (TYPE_COLORS, clear_template_cache, create_card_background, create_gold_gradient,
+                     create_nft_card, create_shining_card, create_texture_overlay, get_artwork_name,
+                     render_nft_card, render_shining_card)
+from artwork_cache import ArtworkCache, artwork_key, set_artwork_cache, species_key
+from encoders import DEFAULT_ENCODER, available_encoders, encode_image
+from text_cache import clear_text_cache
+import instrumentation
+
+WIDTH = 750
+HEIGHT = 1050
+
+
+# Per-row / per-pixel versions the renderers used before, kept as the baseline
+
+def legacy_card_background(img, pokemon_type, width, height):
+    draw = ImageDraw.Draw(img)
+    primary_color, secondary_color = TYPE_COLORS.get(pokemon_type.lower(), ("#FFFFFF", "#EEEEEE"))
+    for y in range(height):
+        ratio = y / height
+        r = int(int(primary_color[1:3], 16) * (1 - ratio) + int(secondary_color[1:3], 16) * ratio)
+        g = int(int(primary_color[3:5], 16) * (1 - ratio) + int(secondary_color[3:5], 16) * ratio)
+        b = int(int(primary_color[5:7], 16) * (1 - ratio) + int(secondary_color[5:7], 16) * ratio)
+        draw.line([(0, y), (width, y)], fill=f"#{r:02x}{g:02x}{b:02x}")
+
+def legacy_gold_gradient(width, height):
+    gold_overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    gold_draw = ImageDraw.Draw(gold_overlay)
+    for y in range(height):
+        gold_draw.line([(0, y), (width, y)], fill=(255, 215, 0, int(35 * (1 - y / height))))
+    return gold_overlay
+
+def legacy_texture_overlay(width, height):
+    texture = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+    texture_draw = ImageDraw.Draw(texture)
+    for i in range(0, width, 4):
+        for j in range(0, height, 4):
+            if random.random() > 0.5:
+                texture_draw.point((i, j), fill=(255, 255, 255, 5))
+    return texture
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def compare_gradients(repeat=20):
+    """Time the legacy and array-based background, gold gradient and texture paths"""
+    def background(create):
+        def run():
+            for pokemon_type in TYPE_COLORS:
+                create(Image.new('RGBA', (WIDTH, HEIGHT), 'white'), pokemon_type, WIDTH, HEIGHT)
+        return run
+
+    cases = [
+        ('background', background(legacy_card_background), background(create_card_background), len(TYPE_COLORS)),
+        ('gold_gradient', lambda: legacy_gold_gradient(WIDTH, HEIGHT), lambda: create_gold_gradient(WIDTH, HEIGHT), 1),
+        ('texture', lambda: legacy_texture_overlay(WIDTH, HEIGHT), lambda: create_texture_overlay(WIDTH, HEIGHT), 1),
+    ]
+    rows = []
+    for name, legacy, vectorized, per_call in cases:
+        before = _time(legacy, repeat) / per_call
+        after = _time(vectorized, repeat) / per_call
+        rows.append((name, before, after))
+    return rows
+
+def gradients_main(args):
+    rows = compare_gradients(args.repeat)
+    print(f"{'stage':<16}{'legacy ms':>12}{'array ms':>12}{'speedup':>10}")
+    for name, before, after in rows:
+        print(f"{name:<16}{before * 1000:>12.2f}{after * 1000:>12.2f}{before / after:>9.1f}x")
+
+    # A regular card runs the background and texture, a shining card the gold gradient
+    timings = {name: (before, after) for name, before, after in rows}
+    for card, stages in (('regular', ('background', 'texture')), ('shining', ('gold_gradient',))):
+        before = sum(timings[stage][0] for stage in stages)
+        after = sum(timings[stage][1] for stage in stages)
+        print(f"per {card} card: {before * 1000:.1f} ms -> {after * 1000:.1f} ms saved {(before - after) * 1000:.1f} ms")
+
+
+# Full-card suite: a fixed synthetic deck rendered offline with per-stage timings
+
+def synthetic_deck():
+    """One regular and one shining card for every type, with fixed stats and text"""
+    deck = []
+    for i, pokemon_type in enumerate(TYPE_COLORS):
+        pokemon = {
+            'name': f"Bench{pokemon_type.capitalize()}",
+            'type': pokemon_type,
+            'hp': 60 + 8 * i,
+            'attack': 50 + 5 * i,
+            'defense': 40 + 4 * i,
+            'attacks': [
+                {'name': "Quick Attack", 'damage': 20 + i},
+                {'name': f"{pokemon_type.capitalize()} Blast", 'damage': 60 + 2 * i},
+            ],
+            'text': f"a synthetic {pokemon_type} pokemon that only exists to benchmark the card renderers.",
+        }
+        deck.append(('regular', pokemon))
+        deck.append(('shining', dict(pokemon, name=f"Shining {pokemon['name']}")))
+    return deck
+
+def artwork_fixture():
+    """PNG bytes standing in for a 475x475 official artwork download"""
+    img = Image.new('RGBA', (475, 475), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([40, 60, 435, 455], fill=(230, 110, 40, 255), outline=(40, 20, 10, 255), width=6)
+    draw.polygon([(120, 140), (237, 20), (355, 140)], fill=(250, 200, 60, 255))
+    draw.ellipse([170, 200, 220, 250], fill=(255, 255, 255, 255))
+    draw.ellipse([255, 200, 305, 250], fill=(255, 255, 255, 255))
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def install_artwork_fixture(cache_dir, deck):
+    """Point get_pokemon_image at an offline cache holding the fixture for every card"""
+    cache = ArtworkCache(cache_dir=cache_dir, offline=True, species_index=False)
+    content = artwork_fixture()
+    for _, pokemon in deck:
+        name = get_artwork_name(pokemon['name']).lower()
+        artwork = {'front_default': f"fixture://{name}.png", 'front_shiny': f"fixture://{name}-shiny.png"}
+        species = {'sprites': {'other': {'official-artwork': artwork}}}
+        cache.put(species_key(name), cache.api_url.format(name=name), json.dumps(species).encode())
+        cache.put(artwork_key(name, False), artwork['front_default'], content)
+        cache.put(artwork_key(name, True), artwork['front_shiny'], content)
+    set_artwork_cache(cache)
+
+def _summary(values):
+    values = sorted(values)
+    return {
+        'mean': statistics.fmean(values) * 1000,
+        'median': statistics.median(values) * 1000,
+        'p95': values[min(len(values) - 1, int(len(values) * 0.95))] * 1000,
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(repeat=3, seed=0, cold_templates=False):
+    """Render the synthetic deck ``repeat`` times and return a JSON-ready report"""
+    deck = synthetic_deck()
+    renderers = {'regular': create_nft_card, 'shining': create_shining_card}
+    card_times = defaultdict(list)
+
+    clear_template_cache()
+    clear_text_cache()
+    with tempfile.TemporaryDirectory() as tmp:
+        install_artwork_fixture(os.path.join(tmp, 'artwork'), deck)
+        registry = instrumentation.enable()
+        start = time.perf_counter()
+        try:
+            # The renderers print a line per card; keep the report readable
+            with contextlib.redirect_stdout(StringIO()):
+                for _ in range(repeat):
+                    for kind, pokemon in deck:
+                        if cold_templates:
+                            clear_template_cache()
+                        random.seed(f"{seed}:{kind}:{pokemon['name']}")
+                        card_start = time.perf_counter()
+                        renderers[kind](pokemon, output_dir=tmp)
+                        card_times[kind].append(time.perf_counter() - card_start)
+        finally:
+            instrumentation.disable()
+            set_artwork_cache(None)
+        elapsed = time.perf_counter() - start
+
+    cards = len(deck) * repeat
+    snapshot = registry.snapshot()
+    return {
+        'benchmark': 'render_suite',
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'cards': cards,
+        'cold_templates': cold_templates,
+        'seconds': elapsed,
+        'cards_per_second': cards / elapsed,
+        'per_card_ms': {kind: _summary(times) for kind, times in card_times.items()},
+        # Stage time per rendered card; background/frame/chrome only run on template misses
+        'stages': {
+            stage: {'calls': stats['count'], 'total_ms': stats['total'] * 1000, 'per_card_ms': stats['total'] * 1000 / cards}
+            for stage, stats in sorted(snapshot['stages'].items(), key=lambda item: -item[1]['total'])
+        },
+        'counters': snapshot['counters'],
+        'sizes': snapshot['sizes'],
+    }
+
+def print_suite(report, baseline=None):
+    print(f"{report['cards']} cards in {report['seconds']:.2f}s ({report['cards_per_second']:.1f} cards/s)")
+    for kind, summary in report['per_card_ms'].items():
+        print(f"  {kind:<8} mean {summary['mean']:.1f} ms  median {summary['median']:.1f} ms  p95 {summary['p95']:.1f} ms")
+    counters = report.get('counters', {})
+    for name in sorted(name[:-len('_hits')] for name in counters if name.endswith('_hits')):
+        hits, misses = counters[f"{name}_hits"], counters.get(f"{name}_misses", 0)
+        print(f"  {name.replace('_', ' ')}: {hits / (hits + misses) * 100:.1f}% hits ({hits}/{hits + misses})")
+    print(f"\n{'stage':<16}{'ms/card':>10}{'calls':>8}" + (f"{'baseline':>11}{'change':>9}" if baseline else ''))
+    for stage, timing in report['stages'].items():
+        line = f"{stage:<16}{timing['per_card_ms']:>10.2f}{timing['calls']:>8}"
+        if baseline:
+            before = baseline['stages'].get(stage)
+            if before and before['per_card_ms']:
+                change = (timing['per_card_ms'] - before['per_card_ms']) / before['per_card_ms'] * 100
+                line += f"{before['per_card_ms']:>11.2f}{change:>+8.1f}%"
+            else:
+                line += f"{'-':>11}{'new':>9}"
+        print(line)
+
+def suite_main(args):
+    report = run_suite(args.repeat, args.seed, args.cold_templates)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_suite(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+# Encoders: the same rendered cards written in every available output format
+
+def compare_encoders(repeat=3, seed=0, encoders=None):
+    """Encode the synthetic deck with each encoder; returns {encoder: (seconds per card, bytes per card)}"""
+    deck = synthetic_deck()
+    renderers = {'regular': render_nft_card, 'shining': render_shining_card}
+    with tempfile.TemporaryDirectory() as tmp:
+        install_artwork_fixture(os.path.join(tmp, 'artwork'), deck)
+        try:
+            with contextlib.redirect_stdout(StringIO()):
+                images = []
+                for kind, pokemon in deck:
+                    random.seed(f"{seed}:{kind}:{pokemon['name']}")
+                    images.append(renderers[kind](pokemon))
+        finally:
+            set_artwork_cache(None)
+
+    rows = {}
+    for encoder in encoders or available_encoders():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            total_bytes = sum(len(encode_image(img, encoder)) for img in images)
+        rows[encoder] = ((time.perf_counter() - start) / repeat / len(images), total_bytes / len(images))
+    return rows
+
+def encoders_main(args):
+    rows = compare_encoders(args.repeat, args.seed, args.encoder)
+    reference = rows.get(DEFAULT_ENCODER)
+    print(f"{'encoder':<16}{'ms/card':>10}{'KiB/card':>10}" + (f"{'time':>9}{'saved':>9}" if reference else ''))
+    for encoder, (seconds, size) in rows.items():
+        line = f"{encoder:<16}{seconds * 1000:>10.1f}{size / 1024:>10.1f}"
+        if reference:
+            line += f"{seconds / reference[0]:>8.2f}x{(reference[1] - size) / reference[1] * 100:>8.1f}%"
+        print(line)
+    if reference:
+        print(f"\ntime and bytes saved are relative to the default '{DEFAULT_ENCODER}' encoder")
+
+
+# Memory: peak memory of one card render in the default and low-memory modes
+
+def _proc_status(field):
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    return None
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS (VmHWM) for this process; False where that isn't supported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def measure_card_memory(low_memory, seed=0):
+    """Render the synthetic deck and return per-card peaks for each kind
+
+    Pillow allocates pixel buffers outside the Python allocator, so
+    tracemalloc only sees the Python side (random bytes, text, lists).
+    The image buffers show up in the peak RSS above the pre-render
+    baseline, which is only available on Linux.
+    """
+    deck = synthetic_deck()
+    renderers = {'regular': render_nft_card, 'shining': render_shining_card}
+    peaks = defaultdict(list)
+    with tempfile.TemporaryDirectory() as tmp:
+        install_artwork_fixture(os.path.join(tmp, 'artwork'), deck)
+        try:
+            # Load fonts and build every template first so only the render itself is measured
+            for kind, pokemon in deck:
+                renderers[kind](pokemon, low_memory=low_memory)
+            for kind, pokemon in deck:
+                random.seed(f"{seed}:{kind}:{pokemon['name']}")
+                rss_supported = _reset_peak_rss()
+                before = _proc_status('VmRSS') if rss_supported else None
+                tracemalloc.start()
+                img = renderers[kind](pokemon, low_memory=low_memory)
+                _, python_peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                rss_peak = _proc_status('VmHWM') - before if rss_supported else None
+                del img
+                peaks[kind].append({'rss_peak': rss_peak, 'python_peak': python_peak})
+        finally:
+            set_artwork_cache(None)
+    return dict(peaks)
+
+def memory_main(args):
+    if args.child is not None:
+        json.dump(measure_card_memory(args.child == 'low', args.seed), sys.stdout)
+        return
+
+    # One fresh process per mode. A fixed mmap threshold makes glibc hand
+    # freed card buffers back to the OS, so RSS tracks what is actually live.
+    env = dict(os.environ, MALLOC_MMAP_THRESHOLD_='65536')
+    print(f"{'mode':<9}{'card':<9}{'peak RSS MiB':>14}{'max':>8}{'python KiB':>12}")
+    for mode in ('default', 'low'):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), 'memory', '--child', mode,
+                                 '--seed', str(args.seed)], capture_output=True, text=True, env=env, check=True)
+        for kind, cards in json.loads(output.stdout.splitlines()[-1]).items():
+            rss = [card['rss_peak'] for card in cards if card['rss_peak'] is not None]
+            python_peak = max(card['python_peak'] for card in cards)
+            rss_columns = (f"{statistics.fmean(rss) / 2 ** 20:>14.1f}{max(rss) / 2 ** 20:>8.1f}" if rss
+                           else f"{'n/a':>14}{'n/a':>8}")
+            print(f"{mode:<9}{kind:<9}{rss_columns}{python_peak / 1024:>12.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the card renderers")
+    subparsers = parser.add_subparsers(dest='command')
+
+    suite = subparsers.add_parser('suite', help="render a synthetic deck of every type with per-stage timings")
+    suite.add_argument('--repeat', type=int, default=3, help="times to render the whole deck")
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--cold-templates', action='store_true',
+                       help="clear the template cache before every card to time background/frame")
+    suite.add_argument('--output', metavar='PATH', help="write the machine-readable results as JSON")
+    suite.add_argument('--compare', metavar='PATH', help="a previous --output file to diff against")
+    suite.set_defaults(func=suite_main)
+
+    gradients = subparsers.add_parser('gradients', help="compare the legacy per-row loops with the array paths")
+    gradients.add_argument('--repeat', type=int, default=20)
+    gradients.set_defaults(func=gradients_main)
+
+    encoders = subparsers.add_parser('encoders', help="compare encode time and file size of the output formats")
+    encoders.add_argument('--repeat', type=int, default=3)
+    encoders.add_argument('--seed', type=int, default=0)
+    encoders.add_argument('--encoder', action='append', choices=available_encoders(),
+                          help="only this encoder (repeatable); defaults to every one Pillow supports")
+    encoders.set_defaults(func=encoders_main)
+
+    memory = subparsers.add_parser('memory', help="peak memory per card with and without POKEMON_LOW_MEMORY")
+    memory.add_argument('--seed', type=int, default=0)
+    memory.add_argument('--child', choices=['default', 'low'], help=argparse.SUPPRESS)
+    memory.set_defaults(func=memory_main)
+
+    # Run the suite when no subcommand is given
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in subparsers.choices and argv[0] not in ('-h', '--help'):
+        argv = ['suite', *argv]
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
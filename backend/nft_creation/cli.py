@@ -0,0 +1,74 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+
+# subcommand: (module whose main() it runs, help). Modules are only imported
+# when their command runs, so --help never loads Pillow or requests.
+COMMANDS = {
+    'render': ('populate', "render every card image"),
+    'metadata': ('generate_metadata', "write the Metaplex metadata"),
+    'all': ('pipeline', "render every card and write its metadata in one pass"),
+    'animate': ('animation', "render animated shining cards"),
+    'merge-shards': ('shards', "combine the partial manifests of a sharded render"),
+    'atlas': ('atlas', "pack rendered cards into sprite sheets"),
+    'archive': ('archive', "list or extract single files from card archives"),
+    'species': ('species_index', "import a PokeAPI dump into the local species index"),
+    'serve': ('server', "serve card previews rendered on demand"),
+    'upload': ('upload', "upload new and changed cards and update mappings.json"),
+}
+
+# Interpreter start-up excluded; what `cli.py --help` may add on top of `python -c pass`
+STARTUP_BUDGET_MS = 50
+
+
+def run_command(name, argv):
+    module = importlib.import_module(COMMANDS[name][0])
+    return module.main(argv)
+
+
+def _median_run_ms(command, runs):
+    import statistics
+    import subprocess
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def check_startup(budget_ms=STARTUP_BUDGET_MS, runs=5):
+    """Time `cli.py --help` and each command's imports in fresh interpreters; False if over budget"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    baseline = _median_run_ms([sys.executable, '-c', 'pass'], runs)
+    startup = _median_run_ms([sys.executable, os.path.join(here, 'cli.py'), '--help'], runs) - baseline
+    print(f"interpreter: {baseline:.1f} ms")
+    print(f"cli.py --help: +{startup:.1f} ms (budget {budget_ms} ms)")
+    for name, (module, _) in COMMANDS.items():
+        command = [sys.executable, '-c', f"import sys; sys.path.insert(0, {here!r}); import {module}"]
+        print(f"  {name} imports: +{_median_run_ms(command, runs) - baseline:.1f} ms")
+    return startup <= budget_ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pokemon card rendering tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (module, help_text) in COMMANDS.items():
+        # Options (including --help) are passed through to the module's own parser
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    startup = subparsers.add_parser('startup-check', help="fail if start-up exceeds the time budget")
+    startup.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    startup.add_argument('--runs', type=int, default=5)
+    args, rest = parser.parse_known_args(argv)
+
+    if args.command == 'startup-check':
+        if rest:
+            parser.error(f"unrecognized arguments: {' '.join(rest)}")
+        return 0 if check_startup(args.budget_ms, args.runs) else 1
+    return run_command(args.command, rest)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+import json
+import os
+
+from PIL import Image
+
+from encoders import encode_image, image_extensions, image_filename, write_output
+from instrumentation import observe_size
+
+# Smaller copies of every card, by name and width; the height keeps the card's aspect ratio.
+# Each one lands in a subdirectory of the card's output directory with the same file name.
+DERIVATIVE_SIZES = {
+    'grid': 300,
+    'thumbnail': 150,
+}
+
+# Stored next to the cards, mapping each card to its variants
+SIZE_MANIFEST_NAME = 'sizes.json'
+
+
+def parse_sizes(spec):
+    """Parse ``name=width,name=width`` (e.g. ``grid=300,thumbnail=150``)"""
+    sizes = {}
+    for item in spec.split(','):
+        name, _, width = item.partition('=')
+        if not name.strip() or not width.strip().isdigit() or int(width) <= 0:
+            raise ValueError(f"Expected name=width, got {item!r}")
+        sizes[name.strip()] = int(width)
+    return sizes
+
+
+def derivative_dimensions(width, height, target_width):
+    return target_width, max(1, round(height * target_width / width))
+
+
+def build_derivatives(img, sizes=None):
+    """Downscale one render to every size, largest first, returning ``{name: image}``
+
+    Each size is resampled from the previous (larger) one rather than from
+    the full render: halve with Image.reduce while the image is still at
+    least twice the target, then finish with a single Lanczos resize.
+    """
+    sizes = DERIVATIVE_SIZES if sizes is None else sizes
+    variants = {}
+    current = img
+    for name, width in sorted(sizes.items(), key=lambda item: -item[1]):
+        target = derivative_dimensions(img.width, img.height, width)
+        if target[0] >= current.width:
+            variants[name] = current
+            continue
+        while current.width >= 2 * target[0] and current.height >= 2 * target[1]:
+            current = current.reduce(2)
+        if current.size != target:
+            current = current.resize(target, Image.LANCZOS)
+        variants[name] = current
+    return variants
+
+
+def derivative_path(output_dir, size_name, pokemon, encoder=None):
+    return os.path.join(output_dir, size_name, image_filename(pokemon['name'], encoder))
+
+
+def save_derivatives(img, pokemon, output_dir, sizes=None, encoder=None, sink=None):
+    """Write every derivative of a rendered card, to disk or ``sink``, and return ``{name: path}``"""
+    paths = {}
+    for name, variant in build_derivatives(img, sizes).items():
+        path = derivative_path(output_dir, name, pokemon, encoder)
+        if sink is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = encode_image(variant, encoder)
+        observe_size('derivative_bytes', len(data))
+        write_output(path, data, sink)
+        paths[name] = path
+    return paths
+
+
+def size_manifest_entry(pokemon, output_dir, card_size, sizes=None, encoder=None):
+    """The variants of one card: file path (relative to ``output_dir``), width, height and bytes"""
+    sizes = DERIVATIVE_SIZES if sizes is None else sizes
+    width, height = card_size
+    variants = {'full': (image_filename(pokemon['name'], encoder), width, height)}
+    for name, target_width in sizes.items():
+        variants[name] = (os.path.join(name, image_filename(pokemon['name'], encoder)),
+                          *derivative_dimensions(width, height, min(target_width, width)))
+    entry = {}
+    for name, (path, variant_width, variant_height) in variants.items():
+        full_path = os.path.join(output_dir, path)
+        entry[name] = {
+            'path': path.replace(os.sep, '/'),
+            'width': variant_width,
+            'height': variant_height,
+            'bytes': os.path.getsize(full_path) if os.path.isfile(full_path) else None,
+        }
+    return entry
+
+
+def recorded_sizes(output_dir):
+    """Names of the derivative sizes the size manifest in ``output_dir`` lists, i.e. what the last run wrote"""
+    try:
+        with open(os.path.join(output_dir, SIZE_MANIFEST_NAME), 'r') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return {name for entry in entries.values() for name in entry if name != 'full'}
+
+
+def remove_stale_derivatives(output_dir, keep=()):
+    """Delete the derivative sizes an earlier run wrote that are not in ``keep``
+
+    Their card images go, then their directory once it is empty; with no
+    sizes kept the size manifest goes too. Returns the paths removed.
+    """
+    suffixes = tuple(f"_nft.{extension}" for extension in image_extensions())
+    removed = []
+    for name in sorted(recorded_sizes(output_dir) - set(keep)):
+        directory = os.path.join(output_dir, name)
+        if not os.path.isdir(directory):
+            continue
+        for item in os.listdir(directory):
+            item_path = os.path.join(directory, item)
+            if item.endswith(suffixes) and os.path.isfile(item_path):
+                os.remove(item_path)
+                removed.append(item_path)
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+    manifest_path = os.path.join(output_dir, SIZE_MANIFEST_NAME)
+    if not keep and os.path.isfile(manifest_path):
+        os.remove(manifest_path)
+        removed.append(manifest_path)
+    return removed
+
+
+def save_size_manifest(output_dir, entries):
+    path = os.path.join(output_dir, SIZE_MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
@@ -0,0 +1,82 @@
+from io import BytesIO
+import os
+
+# Output formats for the rendered cards. ``options`` go straight to
+# Image.save; 'png' is what the renderers have always written (Pillow's
+# default zlib level 6, the old quality=95 is ignored for PNG).
+ENCODERS = {
+    'png': {'format': 'PNG', 'extension': 'png', 'mime': 'image/png', 'options': {}},
+    'png-fast': {'format': 'PNG', 'extension': 'png', 'mime': 'image/png',
+                 'options': {'compress_level': 1}},
+    'png-small': {'format': 'PNG', 'extension': 'png', 'mime': 'image/png',
+                  'options': {'compress_level': 9, 'optimize': True}},
+    'webp': {'format': 'WEBP', 'extension': 'webp', 'mime': 'image/webp',
+             'options': {'quality': 90, 'method': 4}},
+    'webp-lossless': {'format': 'WEBP', 'extension': 'webp', 'mime': 'image/webp',
+                      'options': {'lossless': True, 'quality': 80, 'method': 4}},
+    'avif': {'format': 'AVIF', 'extension': 'avif', 'mime': 'image/avif',
+             'options': {'quality': 80}},
+}
+
+DEFAULT_ENCODER = 'png'
+
+# Pillow feature each non-PNG format needs
+_FEATURES = {'WEBP': 'webp', 'AVIF': 'avif'}
+
+
+def is_supported(name):
+    """Whether the installed Pillow can write ``name``"""
+    feature = _FEATURES.get(ENCODERS[name]['format'])
+    if feature is None:
+        return True
+    from PIL import features
+    return bool(features.check(feature))
+
+
+def available_encoders():
+    return [name for name in ENCODERS if is_supported(name)]
+
+
+def get_encoder(name=None):
+    """Look up an encoder by name, failing early if Pillow can't write it"""
+    name = name or DEFAULT_ENCODER
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown encoder {name!r}, expected one of {', '.join(ENCODERS)}")
+    if not is_supported(name):
+        raise ValueError(f"Encoder {name!r} is not supported by the installed Pillow")
+    return ENCODERS[name]
+
+
+def encode_image(img, encoder=None):
+    """Encode ``img`` with the named encoder and return the bytes"""
+    spec = get_encoder(encoder)
+    buffer = BytesIO()
+    img.save(buffer, format=spec['format'], **spec['options'])
+    return buffer.getvalue()
+
+
+def write_atomic(path, data):
+    """Write ``data`` to a temp file next to ``path`` and rename it into place
+
+    A crash mid-write leaves a stray ``.tmp`` file, never a truncated image.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_output(path, data, sink=None):
+    """Write ``data`` to ``path`` on disk, or hand it to ``sink`` (see archive.py) under that path"""
+    if sink is None:
+        write_atomic(path, data)
+    else:
+        sink.write(path, data)
+
+
+def image_filename(pokemon_name, encoder=None):
+    return f"{pokemon_name}_nft.{ENCODERS[encoder or DEFAULT_ENCODER]['extension']}"
+
+
+def image_extensions():
+    return {spec['extension'] for spec in ENCODERS.values()}
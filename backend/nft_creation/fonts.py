@@ -0,0 +1,115 @@
+from PIL import ImageFont
+import functools
+import hashlib
+import os
+import threading
+
+# Bundled fonts; a missing file just falls through to the next font set
+FONTS_DIR = os.path.join(os.path.dirname(__file__), 'fonts')
+
+# Pokemon font file path
+HOLLOW_FONT = os.path.join(FONTS_DIR, 'Pokemon Hollow.ttf')
+SOLID_FONT = os.path.join(FONTS_DIR, 'Pokemon Solid.ttf')
+TEXT_FONT = os.path.join(FONTS_DIR, 'ShortBaby-Mg2w.ttf')
+
+# Card title fonts, tried as a set so a card never mixes Pokemon and system fonts
+FONT_SETS = [
+    ('Pokemon', {
+        'title': (SOLID_FONT, 40),
+        'name': (SOLID_FONT, 70),
+        'stats': (HOLLOW_FONT, 30),
+        'attack_name': (HOLLOW_FONT, 50),
+        'attack_damage': (SOLID_FONT, 50),
+    }),
+    ('system', {
+        'title': ('arial.ttf', 80),
+        'name': ('arial.ttf', 65),
+        'stats': ('arial.ttf', 50),
+        'attack_name': ('arial.ttf', 120),
+        'attack_damage': ('arial.ttf', 130),
+    }),
+]
+
+# Body text fonts, falling back to Pillow's default font on their own
+TEXT_FONTS = {
+    'hp': (TEXT_FONT, 16),
+    'description': (TEXT_FONT, 24),
+}
+
+_registry_lock = threading.RLock()
+_fonts = None
+_picked = {}
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(path, size):
+    return ImageFont.truetype(path, size)
+
+
+def get_font(path, size):
+    """Return the font for (path, size), parsing the file only the first time"""
+    with _registry_lock:
+        return _load_font(path, size)
+
+
+def _resolve_fonts():
+    fonts = {}
+    for set_name, roles in FONT_SETS:
+        try:
+            fonts = {role: get_font(path, size) for role, (path, size) in roles.items()}
+            _picked.update(roles)
+            break
+        except Exception as e:
+            print(f"Warning: Could not load {set_name} font ({str(e)}). Trying the next fallback.")
+    else:
+        print("Warning: Could not load any card fonts. Using default font.")
+        fonts = {role: ImageFont.load_default() for role in FONT_SETS[0][1]}
+        _picked.update({role: None for role in fonts})
+
+    for role, (path, size) in TEXT_FONTS.items():
+        try:
+            fonts[role] = get_font(path, size)
+            _picked[role] = (path, size)
+        except Exception as e:
+            print(f"Warning: Could not load text font ({str(e)}). Using default font.")
+            fonts[role] = ImageFont.load_default()
+            _picked[role] = None
+    return fonts
+
+
+def get_fonts():
+    """Get the font objects for different text elements, resolved once per process"""
+    global _fonts
+    if _fonts is None:
+        with _registry_lock:
+            if _fonts is None:
+                _fonts = _resolve_fonts()
+    return _fonts
+
+
+def preload_fonts():
+    """Resolve every font up front, e.g. as a process pool initializer"""
+    get_fonts()
+
+
+@functools.lru_cache(maxsize=None)
+def font_file_hash(path):
+    """sha256 of a font file, read once per process"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def font_report():
+    """Describe which font file was picked for each role, with its sha256 prefix"""
+    get_fonts()
+    lines = []
+    for role, picked in sorted(_picked.items()):
+        if picked is None:
+            lines.append(f"{role:<14}Pillow default")
+            continue
+        path, size = picked
+        digest = ''
+        if os.path.isfile(path):
+            digest = f" sha256:{font_file_hash(path)[:12]}"
+        lines.append(f"{role:<14}{os.path.basename(path)} ({size}pt){digest}")
+    return lines
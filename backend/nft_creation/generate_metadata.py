@@ -1,43 +1,73 @@
+import argparse
 import json
 import os
 from datetime import datetime
 
-def generate_metadata(pokemon, is_shining=False):
-    """Generate Metaplex metadata for a Pokemon card"""
+from encoders import ENCODERS, get_encoder, image_filename
+
+def card_attributes(pokemon, is_shining=False):
+    """The card's own traits: type, stats, rarity and its attacks' names and damage"""
+    attributes = [
+        {
+            "trait_type": "Type",
+            "value": pokemon['type'].capitalize()
+        },
+        {
+            "trait_type": "HP",
+            "value": pokemon['hp']
+        },
+        {
+            "trait_type": "Attack",
+            "value": pokemon['attack']
+        },
+        {
+            "trait_type": "Defense",
+            "value": pokemon['defense']
+        },
+        {
+            "trait_type": "Rarity",
+            "value": "Shining" if is_shining else "Regular"
+        }
+    ]
+
+    # Add attack information as attributes
+    for i, attack in enumerate(pokemon['attacks'], 1):
+        attributes.extend([
+            {
+                "trait_type": f"Attack {i} Name",
+                "value": attack['name']
+            },
+            {
+                "trait_type": f"Attack {i} Damage",
+                "value": attack['damage']
+            }
+        ])
+    return attributes
+
+def generate_metadata(pokemon, is_shining=False, file_info=None, encoder=None, rarity=None):
+    """Generate Metaplex metadata for a Pokemon card
+
+    ``file_info`` (e.g. the size and sha256 of the encoded image) is merged
+    into the card's ``properties.files`` entry. ``encoder`` is the format the
+    card image was written in (see encoders.py). ``rarity`` is a
+    CollectionRarity (see rarity.py) whose score and rank for this card are
+    added to the attributes.
+    """
+    image = image_filename(pokemon['name'], encoder)
+
     # Base metadata structure
     metadata = {
         "name": f"{pokemon['name']} {'Shining' if is_shining else ''} Card",
         "symbol": "POKE",
         "description": pokemon['text'],
         "seller_fee_basis_points": 500,  # 5% royalty
-        "image": f"{pokemon['name']}_nft.png",
-        "attributes": [
-            {
-                "trait_type": "Type",
-                "value": pokemon['type'].capitalize()
-            },
-            {
-                "trait_type": "HP",
-                "value": pokemon['hp']
-            },
-            {
-                "trait_type": "Attack",
-                "value": pokemon['attack']
-            },
-            {
-                "trait_type": "Defense",
-                "value": pokemon['defense']
-            },
-            {
-                "trait_type": "Rarity",
-                "value": "Shining" if is_shining else "Regular"
-            }
-        ],
+        "image": image,
+        "attributes": card_attributes(pokemon, is_shining),
         "properties": {
             "files": [
                 {
-                    "uri": f"{pokemon['name']}_nft.png",
-                    "type": "image/png"
+                    "uri": image,
+                    "type": get_encoder(encoder)['mime']
                 }
             ],
             "category": "image",
@@ -50,58 +80,175 @@ def generate_metadata(pokemon, is_shining=False):
         }
     }
 
-    # Add attack information as attributes
-    for i, attack in enumerate(pokemon['attacks'], 1):
-        metadata['attributes'].extend([
-            {
-                "trait_type": f"Attack {i} Name",
-                "value": attack['name']
-            },
-            {
-                "trait_type": f"Attack {i} Damage",
-                "value": attack['damage']
-            }
-        ])
+    if file_info:
+        metadata['properties']['files'][0].update(file_info)
+
+    # Collection-wide rarity score and rank, see rarity.py
+    if rarity is not None:
+        metadata['attributes'].extend(rarity.attributes('shining' if is_shining else 'regular', pokemon['name']))
 
     return metadata
 
-def main():
-    # Load Pokemon data
-    with open(os.path.join(os.path.dirname(__file__), '../../src/data/pokemon.json'), 'r') as f:
-        pokemon_data = json.load(f)
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../src/data')
+METADATA_DIR = os.path.join(os.path.dirname(__file__), '../../public/metadata')
 
-    # Load Shining Pokemon data
-    with open(os.path.join(os.path.dirname(__file__), '../../src/data/shining.json'), 'r') as f:
-        shining_data = json.load(f)
+# How many JSON lines --combined buffers per write
+WRITE_BATCH_SIZE = 500
+
+def iter_records(path, key):
+    """Yield card records from a JSON file (``{key: [...]}``) or a JSON Lines file"""
+    with open(path, 'r') as f:
+        if path.endswith('.jsonl'):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = json.load(f)[key]
+        for pokemon in records:
+            if pokemon and 'name' in pokemon:
+                yield pokemon
+
+def dump_metadata(metadata, compact=False):
+    if compact:
+        return json.dumps(metadata, separators=(',', ':'))
+    return json.dumps(metadata, indent=2)
+
+def write_metadata_files(records, output_dir, is_shining=False, compact=False, verbose=True, encoder=None,
+                         sink=None, rarity=None):
+    """Write one ``*_metadata.json`` per card as soon as it is generated
+
+    Each file still costs its own open, write and close; for a large
+    collection ``--combined`` writes a single JSON Lines file instead. With
+    ``sink`` (see archive.py) the files go to it instead of ``output_dir``.
+    """
+    count = 0
+    for pokemon in records:
+        metadata = generate_metadata(pokemon, is_shining=is_shining, encoder=encoder, rarity=rarity)
+        output_path = os.path.join(output_dir, f"{pokemon['name']}_metadata.json")
+        text = dump_metadata(metadata, compact)
+        if sink is not None:
+            sink.write(output_path, text.encode())
+        else:
+            with open(output_path, 'w') as f:
+                f.write(text)
+        count += 1
+        if verbose:
+            print(f"Generated metadata for {'shining ' if is_shining else ''}{pokemon['name']}")
+    return count
+
+def write_combined_metadata(sources, output_path, batch_size=WRITE_BATCH_SIZE, encoder=None, rarity=None):
+    """Write every card as one JSON line of a single combined file
+
+    ``sources`` is a list of ``(records, is_shining)`` pairs. Each line holds
+    the card kind, the file name it would have had and its metadata.
+    """
+    count = 0
+    lines = []
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'w', buffering=1024 * 1024) as f:
+        for records, is_shining in sources:
+            for pokemon in records:
+                lines.append(json.dumps({
+                    "kind": "shining" if is_shining else "regular",
+                    "file": f"{pokemon['name']}_metadata.json",
+                    "metadata": generate_metadata(pokemon, is_shining=is_shining, encoder=encoder, rarity=rarity),
+                }, separators=(',', ':')))
+                count += 1
+                if len(lines) >= batch_size:
+                    f.write('\n'.join(lines) + '\n')
+                    lines.clear()
+        if lines:
+            f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, output_path)
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Metaplex metadata for the Pokemon cards")
+    parser.add_argument('--pokemon', default=os.path.join(DATA_DIR, 'pokemon.json'),
+                        help="regular card records (.json or .jsonl)")
+    parser.add_argument('--shining', default=os.path.join(DATA_DIR, 'shining.json'),
+                        help="shining card records (.json or .jsonl)")
+    parser.add_argument('--output-dir', default=METADATA_DIR)
+    parser.add_argument('--compact', action='store_true', help="write JSON without indentation")
+    parser.add_argument('--combined', metavar='PATH',
+                        help="write a single JSON Lines file instead of one file per card")
+    parser.add_argument('--batch-size', type=int, default=WRITE_BATCH_SIZE,
+                        help="with --combined, how many lines to buffer per write")
+    parser.add_argument('--quiet', action='store_true', help="don't print a line per card")
+    parser.add_argument('--encoder', choices=list(ENCODERS), default='png',
+                        help="format the card images were rendered in")
+    parser.add_argument('--archive', metavar='PATH.tar|PATH.zip',
+                        help="stream the metadata files into an archive instead of --output-dir")
+    parser.add_argument('--archive-max-mb', type=float, metavar='MB',
+                        help="split the archive into numbered parts of at most this size")
+    parser.add_argument('--rarity', action='store_true',
+                        help="score every card's traits against the whole collection and add its rarity rank")
+    parser.add_argument('--rarity-report', metavar='PATH',
+                        help="with --rarity, also write trait frequencies and the rarest cards as JSON")
+    args = parser.parse_args(argv)
+    if args.combined and (args.archive or args.archive_max_mb):
+        parser.error("--combined writes a single file; it can't be combined with --archive")
+    if args.archive_max_mb and not args.archive:
+        parser.error("--archive-max-mb needs --archive")
+
+    pokemon_records = iter_records(args.pokemon, 'pokemon')
+    shining_records = iter_records(args.shining, 'shining')
+
+    rarity = None
+    if args.rarity:
+        try:
+            from rarity import CollectionRarity
+        except ImportError as e:
+            parser.error(f"--rarity needs numpy: {e}")
+        # Scoring needs every card up front, so the records are read into memory
+        pokemon_records, shining_records = list(pokemon_records), list(shining_records)
+        rarity = CollectionRarity([(pokemon, False) for pokemon in pokemon_records]
+                                  + [(pokemon, True) for pokemon in shining_records])
+        report = rarity.report()
+        print(f"\nScored {report['cards']} cards on {report['trait_types']} trait types. Rarest:")
+        for card in report['rarest'][:10]:
+            print(f"  #{card['rank']} {card['name']} ({card['kind']}): {card['score']}")
+        if args.rarity_report:
+            with open(args.rarity_report, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Rarity report written to: {args.rarity_report}")
+
+    if args.combined:
+        count = write_combined_metadata(
+            [(pokemon_records, False), (shining_records, True)], args.combined, args.batch_size, args.encoder,
+            rarity)
+        print(f"\nWrote metadata for {count} cards to {args.combined}")
+        return
 
     # Create metadata directories
-    metadata_dir = os.path.join(os.path.dirname(__file__), '../../public/metadata')
+    metadata_dir = args.output_dir
     shiny_metadata_dir = os.path.join(metadata_dir, 'shiny')
-    os.makedirs(metadata_dir, exist_ok=True)
-    os.makedirs(shiny_metadata_dir, exist_ok=True)
+    sink = None
+    if args.archive:
+        from archive import ArchiveSink
+        max_bytes = int(args.archive_max_mb * 1024 * 1024) if args.archive_max_mb else None
+        sink = ArchiveSink(args.archive, max_bytes=max_bytes)
+    else:
+        os.makedirs(metadata_dir, exist_ok=True)
+        os.makedirs(shiny_metadata_dir, exist_ok=True)
 
     # Generate metadata for regular Pokemon
     print("\nGenerating metadata for regular Pokemon...")
-    for pokemon in pokemon_data['pokemon']:
-        metadata = generate_metadata(pokemon)
-        output_path = os.path.join(metadata_dir, f"{pokemon['name']}_metadata.json")
-        with open(output_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        print(f"Generated metadata for {pokemon['name']}")
+    regular_count = write_metadata_files(pokemon_records, metadata_dir, compact=args.compact,
+                                         verbose=not args.quiet, encoder=args.encoder, sink=sink, rarity=rarity)
 
     # Generate metadata for shining Pokemon
     print("\nGenerating metadata for shining Pokemon...")
-    for pokemon in shining_data['shining']:
-        if pokemon and 'name' in pokemon:
-            metadata = generate_metadata(pokemon, is_shining=True)
-            output_path = os.path.join(shiny_metadata_dir, f"{pokemon['name']}_metadata.json")
-            with open(output_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
-            print(f"Generated metadata for shining {pokemon['name']}")
+    shining_count = write_metadata_files(shining_records, shiny_metadata_dir, is_shining=True,
+                                         compact=args.compact, verbose=not args.quiet, encoder=args.encoder,
+                                         sink=sink, rarity=rarity)
 
     print("\nMetadata generation complete!")
-    print(f"Regular metadata saved in: {metadata_dir}")
-    print(f"Shining metadata saved in: {shiny_metadata_dir}")
+    if sink is not None:
+        sink.close()
+        print(f"Metadata saved in {len(sink.archives)} archives, indexed in {sink.index_path} "
+              f"({regular_count} regular, {shining_count} shining cards)")
+        return
+    print(f"Regular metadata saved in: {metadata_dir} ({regular_count} cards)")
+    print(f"Shining metadata saved in: {shiny_metadata_dir} ({shining_count} cards)")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+
+# Registry receiving observations; None means instrumentation is off
+_active = None
+# Extra listeners, called as callback(kind, name, value) for every observation
+_callbacks = []
+
+
+class Registry:
+    """Collects stage timers, counters and byte sizes from the renderers.
+
+    ``kind`` is one of ``'stage'`` (seconds spent in a rendering stage),
+    ``'counter'`` (an event count) or ``'size'`` (a byte count such as a
+    download or an encoded PNG).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.sizes = {}
+
+    def observe(self, kind, name, value):
+        with self._lock:
+            if kind == 'counter':
+                self.counters[name] = self.counters.get(name, 0) + value
+                return
+            series = self.stages if kind == 'stage' else self.sizes
+            count, total, largest = series.get(name, (0, 0, 0))
+            series[name] = (count + 1, total + value, max(largest, value))
+
+    def merge(self, snapshot):
+        """Fold in a snapshot taken in another process"""
+        with self._lock:
+            for name, value in snapshot.get('counters', {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for key, series in (('stages', self.stages), ('sizes', self.sizes)):
+                for name, stats in snapshot.get(key, {}).items():
+                    count, total, largest = series.get(name, (0, 0, 0))
+                    series[name] = (count + stats['count'], total + stats['total'], max(largest, stats['max']))
+
+    def snapshot(self):
+        with self._lock:
+            def series(values):
+                return {name: {'count': count, 'total': total, 'max': largest}
+                        for name, (count, total, largest) in sorted(values.items())}
+            return {
+                'stages': series(self.stages),
+                'counters': dict(sorted(self.counters.items())),
+                'sizes': series(self.sizes),
+            }
+
+    def drain(self):
+        """Return a snapshot and start counting from zero"""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix='pokemon_cards'):
+        """Render the snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent in each card rendering stage",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, stats in snapshot['stages'].items():
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats["total"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        for name, value in snapshot['counters'].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, stats in snapshot['sizes'].items():
+            lines.append(f"# TYPE {prefix}_{name} summary")
+            lines.append(f"{prefix}_{name}_sum {stats['total']}")
+            lines.append(f"{prefix}_{name}_count {stats['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def enable(registry=None):
+    """Start collecting into ``registry`` (a fresh one by default) and return it"""
+    global _active
+    _active = registry or Registry()
+    return _active
+
+
+def disable():
+    global _active
+    _active = None
+
+
+def get_registry():
+    return _active
+
+
+def is_enabled():
+    return _active is not None or bool(_callbacks)
+
+
+def add_callback(callback):
+    _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    _callbacks.remove(callback)
+
+
+def _emit(kind, name, value):
+    if _active is not None:
+        _active.observe(kind, name, value)
+    for callback in _callbacks:
+        callback(kind, name, value)
+
+
+def count(name, value=1):
+    if _active is not None or _callbacks:
+        _emit('counter', name, value)
+
+
+def observe_size(name, nbytes):
+    if _active is not None or _callbacks:
+        _emit('size', name, nbytes)
+
+
+class _StageClock:
+    """Attributes the time since the previous mark to the named stage"""
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        _emit('stage', stage, now - self.last)
+        self.last = now
+
+
+class _NullClock:
+    def mark(self, stage):
+        pass
+
+
+_NULL_CLOCK = _NullClock()
+
+
+def stage_clock():
+    """Return a clock for timing consecutive stages; a shared no-op when disabled"""
+    if _active is None and not _callbacks:
+        return _NULL_CLOCK
+    return _StageClock()
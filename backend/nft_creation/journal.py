@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Kept in the regular cards' state directory (see render_state.py); sharded runs keep one per shard
+JOURNAL_NAME = '.render_journal.jsonl'
+
+
+def shard_journal_name(index, count):
+    return f".render_journal.shard-{index}-of-{count}.jsonl"
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def remove_partial_files(directory):
+    """Delete the ``.tmp`` files an interrupted atomic write left in ``directory``"""
+    removed = []
+    if os.path.isdir(directory):
+        for item in os.listdir(directory):
+            path = os.path.join(directory, item)
+            if item.endswith('.tmp') and os.path.isfile(path):
+                os.remove(path)
+                removed.append(path)
+    return removed
+
+
+class ProgressJournal:
+    """Append-only JSON Lines log of a batch run, synced to disk record by record
+
+    A ``start`` record goes down before a card is rendered and a ``done``
+    record, with the image's file name and sha256, once its files are in
+    place; failures get a ``failed`` record. Replaying the log tells a
+    resumed run which cards finished. A torn last line from a crash is ignored.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.cards = {}
+        self._lock = threading.Lock()
+        if resume:
+            self._replay()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a' if resume else 'w')
+
+    def _replay(self):
+        try:
+            with open(self.path, 'r') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'kind' in record and 'name' in record:
+                self.cards[(record['kind'], record['name'])] = record
+
+    def _append(self, record):
+        record['time'] = time.time()
+        with self._lock:
+            self.cards[(record['kind'], record['name'])] = record
+            self._file.write(json.dumps(record, sort_keys=True) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def start(self, kind, name, attempt=1):
+        self._append({'event': 'start', 'kind': kind, 'name': name, 'attempt': attempt})
+
+    def done(self, kind, name, path, fingerprint, fetch_error=None):
+        self._append({'event': 'done', 'kind': kind, 'name': name, 'file': os.path.basename(path),
+                      'fingerprint': fingerprint, 'sha256': file_sha256(path), 'fetch_error': fetch_error})
+
+    def failed(self, kind, name, error):
+        self._append({'event': 'failed', 'kind': kind, 'name': name, 'error': error})
+
+    def completed(self, kind, name, path, fingerprint):
+        """Whether the journal shows this card finished with these inputs and its image is still intact
+
+        Cards rendered without their artwork don't count, so a resumed run retries the fetch.
+        """
+        record = self.cards.get((kind, name))
+        if (record is None or record['event'] != 'done' or record['fingerprint'] != fingerprint
+                or record.get('fetch_error') or not os.path.isfile(path)):
+            return False
+        return file_sha256(path) == record['sha256']
+
+    def summary(self):
+        events = [record['event'] for record in self.cards.values()]
+        return {event: events.count(event) for event in ('done', 'failed', 'start')}
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+
+from artwork import RENDERER_VERSION
+from encoders import get_encoder, image_extensions
+from fonts import FONT_SETS, TEXT_FONTS, font_file_hash
+from render_state import state_dir, state_path
+
+# One per output directory, kept in its state directory (see render_state.py) rather than
+# next to the cards, which are served from public/
+MANIFEST_NAME = '.render_manifest.json'
+
+
+def shard_manifest_name(index, count):
+    """Partial manifest written by shard ``index`` of ``count`` (see shards.py)"""
+    return f".render_manifest.shard-{index}-of-{count}.json"
+
+
+def font_fingerprint():
+    """Hash of every bundled font file the renderers may pick"""
+    paths = {path for _, roles in FONT_SETS for path, _ in roles.values()}
+    paths |= {path for path, _ in TEXT_FONTS.values()}
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        if os.path.isfile(path):
+            digest.update(f"{os.path.basename(path)}:{font_file_hash(path)}\n".encode())
+    return digest.hexdigest()
+
+
+def card_fingerprint(kind, pokemon, artwork_bytes=None, seed=None, encoder=None, derivatives=None):
+    """Fingerprint of everything that goes into one card's pixels, their encoding and sizes"""
+    digest = hashlib.sha256()
+    digest.update(f"{RENDERER_VERSION}\n{kind}\n{seed}\n{font_fingerprint()}\n".encode())
+    digest.update(json.dumps(get_encoder(encoder), sort_keys=True).encode())
+    if derivatives:
+        digest.update(json.dumps(derivatives, sort_keys=True).encode())
+    digest.update(json.dumps(pokemon, sort_keys=True).encode())
+    digest.update(hashlib.sha256(artwork_bytes or b'').digest())
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir, name=MANIFEST_NAME):
+    """Return {filename: fingerprint} for the cards recorded in ``output_dir``"""
+    try:
+        with open(os.path.join(state_dir(output_dir), name), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, entries, name=MANIFEST_NAME):
+    path = state_path(output_dir, name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def remove_orphans(output_dir, keep):
+    """Delete card images in ``output_dir`` that no current record produces"""
+    suffixes = tuple(f"_nft.{extension}" for extension in image_extensions())
+    removed = []
+    for item in os.listdir(output_dir):
+        item_path = os.path.join(output_dir, item)
+        if item.endswith(suffixes) and item not in keep and os.path.isfile(item_path):
+            os.remove(item_path)
+            removed.append(item_path)
+    return removed
@@ -0,0 +1,101 @@
+from functools import partial
+import argparse
+import hashlib
+import os
+import time
+
+from artwork import artwork_image, card_filename, encode_card, render_nft_card, render_shining_card
+from batch import card_rng, render_batch
+from derivatives import DERIVATIVE_SIZES, parse_sizes, save_derivatives
+from encoders import ENCODERS, write_output
+from generate_metadata import METADATA_DIR, dump_metadata, generate_metadata
+from populate import clear_outputs, load_cards, regular_dir, shiny_dir
+
+RENDERERS = {
+    'regular': render_nft_card,
+    'shining': render_shining_card,
+}
+
+
+def render_card_with_metadata(kind, pokemon, output_dir, artwork_bytes=None, seed=0, encoder=None,
+                              derivatives=None, metadata_dirs=None, compact=False, sink=None):
+    """Render one card, then write its image and metadata from the same in-memory bytes, to disk or ``sink``"""
+    start = time.perf_counter()
+    pokemon_img = artwork_image(artwork_bytes)
+    img = RENDERERS[kind](pokemon, pokemon_img=pokemon_img, rng=card_rng(seed, kind, pokemon['name']))
+
+    # Hash the encoded image before it ever touches the disk
+    data = encode_card(img, encoder)
+    image_path = os.path.join(output_dir, card_filename(pokemon, encoder))
+    write_output(image_path, data, sink)
+    if derivatives:
+        save_derivatives(img, pokemon, output_dir, derivatives, encoder, sink)
+
+    metadata = generate_metadata(pokemon, is_shining=kind == 'shining', encoder=encoder, file_info={
+        'size': len(data),
+        'sha256': hashlib.sha256(data).hexdigest(),
+    })
+    metadata_path = os.path.join(metadata_dirs[kind], f"{pokemon['name']}_metadata.json")
+    write_output(metadata_path, dump_metadata(metadata, compact).encode(), sink)
+    print(f"Rendered {kind} card and metadata for {pokemon['name']}")
+    return image_path, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every card and write its metadata in one pass")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="render processes (0 = one per CPU, 1 = serial)")
+    parser.add_argument('--io-workers', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0, help="mixed into every card's sparkle/texture seed")
+    parser.add_argument('--metadata-dir', default=METADATA_DIR)
+    parser.add_argument('--encoder', choices=list(ENCODERS), default='png', help="card image format")
+    parser.add_argument('--derivatives', nargs='?', type=parse_sizes, metavar='NAME=WIDTH,...',
+                        const=DERIVATIVE_SIZES, help="also write smaller sizes of every card")
+    parser.add_argument('--compact', action='store_true', help="write metadata without indentation")
+    parser.add_argument('--archive', metavar='PATH.tar|PATH.zip',
+                        help="stream cards and metadata into an archive instead of loose files")
+    parser.add_argument('--archive-max-mb', type=float, metavar='MB',
+                        help="split the archive into numbered parts of at most this size")
+    args = parser.parse_args(argv)
+    if args.archive_max_mb and not args.archive:
+        parser.error("--archive-max-mb needs --archive")
+
+    pokemon_cards, shining_cards = load_cards()
+
+    metadata_dirs = {
+        'regular': args.metadata_dir,
+        'shining': os.path.join(args.metadata_dir, 'shiny'),
+    }
+    sink = None
+    if args.archive:
+        from archive import ArchiveSink
+        max_bytes = int(args.archive_max_mb * 1024 * 1024) if args.archive_max_mb else None
+        sink = ArchiveSink(args.archive, max_bytes=max_bytes)
+    else:
+        for directory in [regular_dir, shiny_dir, *metadata_dirs.values()]:
+            os.makedirs(directory, exist_ok=True)
+        clear_outputs((regular_dir, shiny_dir), args.derivatives)
+
+    jobs = [('regular', pokemon, regular_dir) for pokemon in pokemon_cards]
+    jobs += [('shining', pokemon, shiny_dir) for pokemon in shining_cards]
+
+    render_fn = partial(render_card_with_metadata, metadata_dirs=metadata_dirs, compact=args.compact)
+    try:
+        results = render_batch(jobs, workers=args.workers or None, io_workers=args.io_workers,
+                               seed=args.seed, render_fn=render_fn, encoder=args.encoder,
+                               derivatives=args.derivatives, sink=sink)
+    finally:
+        if sink is not None:
+            sink.close()
+
+    if sink is not None:
+        print(f"\nCards and metadata saved in {len(sink.archives)} archives, indexed in {sink.index_path}")
+    else:
+        print(f"\nCards saved in: {regular_dir} and {shiny_dir}")
+        print(f"Metadata saved in: {args.metadata_dir}")
+    # Cards drawn without their artwork are written but incomplete, so the run fails too
+    return 1 if any(result['error'] or result['fetch_error'] for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,22 +1,34 @@
-from artwork import create_nft_card, create_shining_card
+from batch import render_batch
+from derivatives import DERIVATIVE_SIZES, parse_sizes, remove_stale_derivatives
+from encoders import ENCODERS
+from fonts import font_report
+from journal import JOURNAL_NAME, ProgressJournal, remove_partial_files, shard_journal_name
+from render_state import state_path
+from shards import parse_shard, select_shard
+import instrumentation
+import argparse
 import glob
 import os
 import json
 import shutil
 
-# Load Pokemon data from shared JSON file
-with open(os.path.join(os.path.dirname(__file__), '../../src/data/pokemon.json'), 'r') as f:
-    pokemon_data = json.load(f)
-
-# Load Shining Pokemon data
-with open(os.path.join(os.path.dirname(__file__), '../../src/data/shining.json'), 'r') as f:
-    shining_data = json.load(f)
-
-# Create directories if they don't exist
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../src/data')
 regular_dir = os.path.join(os.path.dirname(__file__), '../../public/mons')
 shiny_dir = os.path.join(os.path.dirname(__file__), '../../public/mons/shiny')
-os.makedirs(regular_dir, exist_ok=True)
-os.makedirs(shiny_dir, exist_ok=True)
+
+def load_cards():
+    """Load the regular and shining card records from the shared JSON files"""
+    # Load Pokemon data from shared JSON file
+    with open(os.path.join(DATA_DIR, 'pokemon.json'), 'r') as f:
+        pokemon_data = json.load(f)
+
+    # Load Shining Pokemon data
+    with open(os.path.join(DATA_DIR, 'shining.json'), 'r') as f:
+        shining_data = json.load(f)
+
+    # Check if pokemon exists and has a name
+    shining_cards = [pokemon for pokemon in shining_data['shining'] if pokemon and 'name' in pokemon]
+    return pokemon_data['pokemon'], shining_cards
 
 # Clear existing files in both directories
 def clear_directory(directory):
@@ -25,29 +37,128 @@ def clear_directory(directory):
         if os.path.isfile(item_path):
             os.remove(item_path)
 
-# Clear both directories
-clear_directory(regular_dir)
-clear_directory(shiny_dir)
+def clear_outputs(directories, derivatives=None):
+    """Clear card directories before a full render, along with every derivative size in them
+
+    Sizes an earlier run wrote but ``derivatives`` leaves out are deleted
+    (see remove_stale_derivatives), so they can't go stale next to the new cards.
+    """
+    for directory in directories:
+        for path in remove_stale_derivatives(directory, derivatives or ()):
+            print(f"Removed stale derivative {path}")
+        for name in derivatives or ():
+            if os.path.isdir(os.path.join(directory, name)):
+                clear_directory(os.path.join(directory, name))
+        clear_directory(directory)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Pokemon NFT card images")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="render processes (0 = one per CPU, 1 = serial)")
+    parser.add_argument('--io-workers', type=int, default=8,
+                        help="threads fetching artwork ahead of rendering")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="mixed into every card's sparkle/texture seed; the same seed gives the same bytes")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only re-render cards whose inputs changed and drop orphaned images")
+    parser.add_argument('--encoder', choices=list(ENCODERS), default='png',
+                        help="card image format; png-small trades encode time for smaller files")
+    parser.add_argument('--derivatives', nargs='?', type=parse_sizes, metavar='NAME=WIDTH,...',
+                        const=DERIVATIVE_SIZES,
+                        help="also write smaller sizes of every card, by default grid=300,thumbnail=150")
+    parser.add_argument('--atlas', nargs='?', const='full', metavar='SIZE',
+                        help="pack the cards (or one of their --derivatives sizes) into sprite sheets")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted run: keep the cards its journal shows finished")
+    parser.add_argument('--retries', type=int, default=0,
+                        help="retry cards that fail (or render without artwork) this many more times")
+    parser.add_argument('--retry-backoff', type=float, default=2.0,
+                        help="seconds before the first retry, doubling before each next one")
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help="render only shard I of N of the deck; combine the shards with `cli.py merge-shards`")
+    parser.add_argument('--prefetch', action='store_true',
+                        help="fetch the whole deck's artwork concurrently before rendering")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent prefetch requests")
+    parser.add_argument('--rate', type=float, default=20, help="prefetch requests per second per host")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="collect stage timings, cache and byte counters and write them here")
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json')
+    args = parser.parse_args(argv)
+    if args.shard and args.atlas:
+        parser.error("--atlas needs every card; build it after merging the shards")
+    if args.atlas and args.atlas != 'full' and args.atlas not in (args.derivatives or {}):
+        parser.error(f"--atlas {args.atlas} needs --derivatives to render that size, e.g. {args.atlas}=300")
+
+    pokemon_cards, shining_cards = load_cards()
+
+    # Create directories if they don't exist
+    os.makedirs(regular_dir, exist_ok=True)
+    os.makedirs(shiny_dir, exist_ok=True)
+
+    # Clear both directories, unless we're only rebuilding stale cards,
+    # resuming, or other shards' cards may be sharing them
+    if not args.incremental and not args.resume and not args.shard:
+        clear_outputs((regular_dir, shiny_dir), args.derivatives)
+
+    jobs = [('regular', pokemon, regular_dir) for pokemon in pokemon_cards]
+    jobs += [('shining', pokemon, shiny_dir) for pokemon in shining_cards]
+    if args.shard:
+        jobs = select_shard(jobs, *args.shard)
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: {len(jobs)} cards")
+
+    # Every card is journaled as it goes, so an interrupted run can be resumed. The journal
+    # is build state, so it stays out of public/ (see render_state.py)
+    journal_path = state_path(regular_dir, shard_journal_name(*args.shard) if args.shard else JOURNAL_NAME)
+    if args.resume:
+        for directory in (regular_dir, shiny_dir):
+            for name in ['', *(args.derivatives or ())]:
+                for path in remove_partial_files(os.path.join(directory, name)):
+                    print(f"Removed partial file {path}")
+    journal = ProgressJournal(journal_path, resume=args.resume)
+    if args.resume:
+        progress = journal.summary()
+        print(f"Resuming from {journal_path}: {progress['done']} cards done, {progress['failed']} failed, "
+              f"{progress['start']} interrupted")
+
+    print("\nFonts:")
+    for line in font_report():
+        print(f"  {line}")
+
+    registry = instrumentation.enable() if args.metrics else None
+
+    artwork = None
+    if args.prefetch:
+        # Imported here so runs without --prefetch don't pay for asyncio
+        from prefetch import prefetch_artwork
+        print("\nPrefetching artwork...")
+        artwork = prefetch_artwork(((kind, pokemon) for kind, pokemon, _ in jobs),
+                                   concurrency=args.concurrency, per_host_rate=args.rate)
 
-# Create NFT cards for each Pokemon
-print("\nGenerating Pokemon cards...")
-for pokemon in pokemon_data['pokemon']:
-    create_nft_card(
-        pokemon,
-        output_dir='../../public/mons'
-    )
+    print("\nGenerating Pokemon cards...")
+    try:
+        results = render_batch(jobs, workers=args.workers or None, io_workers=args.io_workers, seed=args.seed,
+                               incremental=args.incremental, artwork=artwork, encoder=args.encoder,
+                               derivatives=args.derivatives, shard=args.shard, journal=journal,
+                               retries=args.retries, retry_backoff=args.retry_backoff)
+    finally:
+        journal.close()
 
-# Create Shining Pokemon cards
-print("\nGenerating Shining Pokemon cards...")
-for pokemon in shining_data['shining']:
-    if pokemon and 'name' in pokemon:  # Check if pokemon exists and has a name
-        create_shining_card(
-            pokemon,
-            output_dir='../../public/mons/shiny'
-        )
+    if args.atlas:
+        from atlas import build_atlas
+        for directory in (regular_dir, shiny_dir):
+            build_atlas(directory if args.atlas == 'full' else os.path.join(directory, args.atlas),
+                        encoder=args.encoder)
 
-print("\nPokemon cards generated successfully!")
-print(f"Regular cards saved in: {regular_dir}")
-print(f"Shining cards saved in: {shiny_dir}")
+    print("\nPokemon cards generated successfully!")
+    print(f"Regular cards saved in: {regular_dir}")
+    print(f"Shining cards saved in: {shiny_dir}")
 
+    if registry is not None:
+        with open(args.metrics, 'w') as f:
+            f.write(registry.to_prometheus() if args.metrics_format == 'prometheus' else registry.to_json())
+        print(f"Metrics written to: {args.metrics}")
+    # Cards drawn without their artwork are written but incomplete, so the run fails too
+    return 1 if any(result['error'] or result['fetch_error'] for result in results) else 0
 
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,156 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+import asyncio
+import json
+import random
+import time
+
+from PIL import Image
+import requests
+from requests.adapters import HTTPAdapter
+
+from artwork import get_artwork_name
+from artwork_cache import OfflineCacheMiss, artwork_key, get_artwork_cache, species_key
+
+# Responses worth retrying; anything else (e.g. a 404 for a bad name) fails at once
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _retryable(error):
+    if isinstance(error, OfflineCacheMiss):
+        return False
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError))
+
+
+class HostRateLimiter:
+    """Spaces out request starts so no host sees more than ``per_second`` of them"""
+
+    def __init__(self, per_second):
+        self.interval = 1 / per_second if per_second else 0
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class ArtworkPrefetcher:
+    """Resolves species JSON and artwork for a whole deck ahead of rendering.
+
+    Requests run concurrently (up to ``concurrency`` at a time) on the
+    artwork cache's keep-alive session, each with its own timeout, retried
+    with exponential backoff and rate limited per host. Everything fetched
+    lands in the artwork cache, so the renderers never block on the network.
+    """
+
+    def __init__(self, cache=None, concurrency=16, timeout=10, retries=3, backoff=0.5, per_host_rate=20):
+        self.cache = cache or get_artwork_cache()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.per_host_rate = per_host_rate
+        self._jitter = random.Random()
+
+        # Keep one pooled connection per concurrent request instead of requests' default of 10
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.cache.session.mount('http://', adapter)
+        self.cache.session.mount('https://', adapter)
+
+    async def _get(self, key, url):
+        content = self.cache.lookup(key, url)
+        if content is not None:
+            return content
+        for attempt in range(self.retries + 1):
+            await self._rate_limiter.wait(url)
+            try:
+                async with self._semaphore:
+                    request = asyncio.get_running_loop().run_in_executor(
+                        self._executor, self.cache.get, key, url, self.timeout)
+                    return await asyncio.wait_for(request, self.timeout * 2)
+            except Exception as e:
+                if attempt == self.retries or not _retryable(e):
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt * (1 + self._jitter.random()))
+
+    def _get_species(self, pokemon_name):
+        # Regular and shining cards share the species JSON, so fetch it once
+        pokemon_name = pokemon_name.lower()
+        task = self._species.get(pokemon_name)
+        if task is None:
+            url = self.cache.api_url.format(name=pokemon_name)
+            task = asyncio.ensure_future(self._get(species_key(pokemon_name), url))
+            self._species[pokemon_name] = task
+        return task
+
+    async def _fetch_artwork(self, pokemon_name, shiny):
+        resolved = self.cache.resolve_artwork(pokemon_name, shiny)
+        if resolved is not None:
+            url, path = resolved
+            if path:
+                return self.cache.read_local_artwork(path)
+            return await self._get(artwork_key(pokemon_name, shiny), url)
+        pokemon_data = json.loads(await self._get_species(pokemon_name))
+        artwork = pokemon_data['sprites']['other']['official-artwork']
+        artwork_url = artwork['front_shiny'] if shiny else artwork['front_default']
+        return await self._get(artwork_key(pokemon_name, shiny), artwork_url)
+
+    async def fetch_all(self, artwork_requests):
+        """Fetch ``(pokemon_name, shiny)`` pairs; returns ``({pair: bytes}, {pair: error})``"""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._rate_limiter = HostRateLimiter(self.per_host_rate)
+        self._species = {}
+        artwork_requests = list(dict.fromkeys(artwork_requests))
+        # One thread per in-flight request; the default executor is sized for CPU work
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self._executor:
+            results = await asyncio.gather(
+                *(self._fetch_artwork(name, shiny) for name, shiny in artwork_requests), return_exceptions=True)
+        fetched, errors = {}, {}
+        for request, result in zip(artwork_requests, results):
+            if isinstance(result, BaseException):
+                errors[request] = result
+            else:
+                fetched[request] = result
+        self.cache.flush()
+        return fetched, errors
+
+    def prefetch(self, artwork_requests):
+        return asyncio.run(self.fetch_all(artwork_requests))
+
+
+def artwork_request(kind, pokemon):
+    """The (species name, shiny) pair a card's artwork is looked up by"""
+    if kind == 'shining':
+        return get_artwork_name(pokemon['name']), True
+    return pokemon['name'], False
+
+
+def prefetch_artwork(cards, **options):
+    """Prefetch the artwork bytes for ``(kind, pokemon)`` cards as ``{(kind, name): bytes}``
+
+    Cards whose artwork could not be fetched are reported and left out.
+    """
+    cards = list(cards)
+    fetched, errors = ArtworkPrefetcher(**options).prefetch(artwork_request(kind, p) for kind, p in cards)
+    for (name, shiny), error in errors.items():
+        print(f"Error fetching Pokemon image for {name}{' (shiny)' if shiny else ''}: {error}")
+    return {
+        (kind, pokemon['name']): fetched[artwork_request(kind, pokemon)]
+        for kind, pokemon in cards if artwork_request(kind, pokemon) in fetched
+    }
+
+
+def prefetch_images(cards, **options):
+    """Like prefetch_artwork, but decoded and ready to pass to the renderers as ``pokemon_img``"""
+    return {key: Image.open(BytesIO(content)) for key, content in prefetch_artwork(cards, **options).items()}
@@ -0,0 +1,102 @@
+import numpy as np
+
+from generate_metadata import card_attributes
+
+# Value recorded for a trait a card doesn't have, e.g. "Attack 3 Name" on a
+# two-attack card. Missing a trait is itself a trait, as marketplaces count it.
+MISSING = None
+REPORT_TOP = 20
+
+
+class CollectionRarity:
+    """Trait frequencies, rarity scores and ranks for a whole collection
+
+    Every trait type becomes one column of integer value codes, one row per
+    card. Frequencies, scores and ranks are then computed column by column
+    with array operations, so the cost grows with cards times trait types
+    rather than with pairs of cards.
+
+    A card's rarity score is the sum over trait types of ``1 / frequency``
+    of its value, the usual marketplace "rarity score". Rank 1 is the
+    rarest card; cards with equal scores share a rank.
+    """
+
+    def __init__(self, cards):
+        """``cards`` yields ``(pokemon, is_shining)`` pairs"""
+        self.keys = []
+        rows = []
+        trait_types = {}
+        for pokemon, is_shining in cards:
+            self.keys.append(('shining' if is_shining else 'regular', pokemon['name']))
+            row = {attribute['trait_type']: attribute['value'] for attribute in card_attributes(pokemon, is_shining)}
+            rows.append(row)
+            for trait_type in row:
+                trait_types.setdefault(trait_type, None)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.trait_types = list(trait_types)
+        size = len(rows)
+
+        # One pass per column assigns value codes in order of first appearance;
+        # keying on the type too keeps 60 and "60" apart
+        self.values, self.codes, self.counts = {}, {}, {}
+        for trait_type in self.trait_types:
+            codes = {}
+            column = ((type(value), value) for value in (row.get(trait_type, MISSING) for row in rows))
+            self.codes[trait_type] = np.fromiter((codes.setdefault(key, len(codes)) for key in column),
+                                                 dtype=np.intp, count=size)
+            self.values[trait_type] = [value for _, value in codes]
+            self.counts[trait_type] = np.bincount(self.codes[trait_type], minlength=len(codes))
+
+        self.scores = np.zeros(size)
+        for trait_type in self.trait_types:
+            self.scores += size / self.counts[trait_type][self.codes[trait_type]]
+        # Rank = 1 + the number of cards with a strictly higher score
+        ascending = np.sort(self.scores)
+        self.ranks = 1 + size - np.searchsorted(ascending, self.scores, side='right')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def attributes(self, kind, pokemon_name):
+        """The extra metadata attributes for one card"""
+        i = self.index[(kind, pokemon_name)]
+        return [
+            {
+                "trait_type": "Rarity Score",
+                "value": round(float(self.scores[i]), 2)
+            },
+            {
+                "trait_type": "Rarity Rank",
+                "value": int(self.ranks[i])
+            }
+        ]
+
+    def report(self, top=REPORT_TOP):
+        """Summary of the collection: every trait value's count and frequency and the rarest cards"""
+        size = len(self)
+        traits = {}
+        for trait_type in self.trait_types:
+            order = np.argsort(self.counts[trait_type], kind='stable')
+            traits[trait_type] = [
+                {
+                    'value': self.values[trait_type][i],
+                    'count': int(self.counts[trait_type][i]),
+                    'frequency': round(float(self.counts[trait_type][i]) / size, 6),
+                }
+                for i in order
+            ]
+        rarest = np.lexsort((np.arange(size), self.ranks))[:top]
+        return {
+            'cards': size,
+            'trait_types': len(self.trait_types),
+            'traits': traits,
+            'rarest': [
+                {
+                    'kind': self.keys[i][0],
+                    'name': self.keys[i][1],
+                    'score': round(float(self.scores[i]), 2),
+                    'rank': int(self.ranks[i]),
+                }
+                for i in rarest
+            ],
+        }
@@ -0,0 +1,33 @@
+import hashlib
+import os
+
+# Build state (fingerprint manifests, progress journals) lives here, out of the
+# site's public directory the cards are written to. Override with POKEMON_RENDER_STATE.
+RENDER_STATE_DIR = os.environ.get(
+    'POKEMON_RENDER_STATE',
+    os.path.join(os.path.dirname(__file__), '.render_state')
+)
+PUBLIC_DIR = os.path.join(os.path.dirname(__file__), '../../public')
+
+
+def state_dir(output_dir):
+    """The directory holding the build state for the cards rendered into ``output_dir``
+
+    Output directories under public/ keep their relative path, e.g.
+    ``mons/shiny``; any other directory is keyed by a hash of its absolute path.
+    """
+    output_dir = os.path.abspath(output_dir)
+    public_dir = os.path.abspath(PUBLIC_DIR)
+    if os.path.commonpath([output_dir, public_dir]) == public_dir:
+        name = os.path.relpath(output_dir, public_dir)
+    else:
+        digest = hashlib.sha256(output_dir.encode()).hexdigest()[:16]
+        name = os.path.join('other', f"{os.path.basename(output_dir)}-{digest}")
+    return os.path.join(RENDER_STATE_DIR, name)
+
+
+def state_path(output_dir, name):
+    """Path of the state file ``name`` for ``output_dir``, creating its directory"""
+    directory = state_dir(output_dir)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
@@ -0,0 +1,230 @@
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import argparse
+import json
+import threading
+import time
+
+from artwork import TYPE_COLORS, artwork_image, render_card_bytes
+from batch import card_rng, fetch_artwork
+from encoders import ENCODERS, get_encoder
+from manifest import card_fingerprint
+from populate import load_cards
+
+# Upper bound on the encoded cards kept in memory (a PNG card is ~150 KB)
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Fields the renderers read from a card record
+REQUIRED_FIELDS = ('name', 'type', 'hp', 'attack', 'defense', 'attacks', 'text')
+
+
+class ResponseCache:
+    """Bounded LRU of encoded cards keyed by card fingerprint"""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def info(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an ``If-None-Match`` header lists ``etag`` (compared weakly, as RFC 9110 asks) or is ``*``"""
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*' or tag.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class CardService:
+    """Renders cards to encoded bytes on demand, caching the responses"""
+
+    def __init__(self, cards=(), seed=0, encoder=None, cache_max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.cards = {(kind, pokemon['name'].lower()): pokemon for kind, pokemon in cards}
+        self.seed = seed
+        self.encoder = encoder
+        self.cache = ResponseCache(cache_max_bytes)
+        # Each card has its own rng, but the cached FreeType fonts and text sprites (fonts.py,
+        # text_cache.py) are shared and not known to be thread-safe, so renders take turns
+        self._render_lock = threading.Lock()
+
+    def find(self, kind, name):
+        return self.cards.get((kind, name.lower()))
+
+    def prepare(self, kind, pokemon, encoder=None):
+        """Fetch the artwork and fingerprint a card; returns ``(etag, artwork_bytes)``"""
+        try:
+            artwork_bytes = fetch_artwork(kind, pokemon)
+        except Exception as e:
+            print(f"Error fetching Pokemon image for {pokemon['name']}: {e}")
+            artwork_bytes = None
+        fingerprint = card_fingerprint(kind, pokemon, artwork_bytes, self.seed, encoder or self.encoder)
+        return f'"{fingerprint[:32]}"', artwork_bytes
+
+    def render(self, kind, pokemon, encoder=None, prepared=None):
+        """Return ``(etag, bytes)`` for a card, rendering it only on a cache miss"""
+        encoder = encoder or self.encoder
+        etag, artwork_bytes = prepared or self.prepare(kind, pokemon, encoder)
+        data = self.cache.get(etag)
+        if data is None:
+            pokemon_img = artwork_image(artwork_bytes)
+            with self._render_lock:
+                data = render_card_bytes(pokemon, shining=kind == 'shining', pokemon_img=pokemon_img,
+                                         encoder=encoder, rng=card_rng(self.seed, kind, pokemon['name']))
+            self.cache.put(etag, data)
+        return etag, data
+
+    def prewarm(self, encoder=None):
+        """Render every known card into the response cache"""
+        start = time.perf_counter()
+        for (kind, _), pokemon in self.cards.items():
+            try:
+                self.render(kind, pokemon, encoder)
+            except Exception as e:
+                print(f"Failed to prewarm {kind} card {pokemon['name']}: {e}")
+        print(f"Prewarmed {len(self.cards)} cards in {time.perf_counter() - start:.2f}s")
+
+
+class CardRequestHandler(BaseHTTPRequestHandler):
+    """``GET /cards/<kind>/<name>``, ``POST /render`` and ``GET /health``
+
+    Both card routes take ``?encoder=`` (see encoders.py). ``POST /render``
+    expects ``{"kind": "regular" | "shining", "pokemon": {...record...}}``.
+    ``HEAD`` works like ``GET`` but sends only the headers.
+    """
+
+    service = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        if parts == ['health']:
+            return self.send_json(200, {'cards': len(self.service.cards), 'cache': self.service.cache.info()})
+        if len(parts) != 3 or parts[0] != 'cards':
+            return self.send_json(404, {'error': "expected /cards/<kind>/<name>"})
+        pokemon = self.service.find(parts[1], parts[2])
+        if pokemon is None:
+            return self.send_json(404, {'error': f"no {parts[1]} card named {parts[2]}"})
+        self.send_card(parts[1], pokemon, url.query)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') != '/render':
+            return self.send_json(404, {'error': "expected /render"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            kind, pokemon = body.get('kind', 'regular'), body['pokemon']
+            missing = [field for field in REQUIRED_FIELDS if field not in pokemon]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return self.send_json(400, {'error': 'expected {"kind": ..., "pokemon": {...}}'})
+        if kind not in ('regular', 'shining'):
+            return self.send_json(400, {'error': f"kind must be 'regular' or 'shining', not {kind!r}"})
+        if missing:
+            return self.send_json(400, {'error': f"card record is missing {', '.join(missing)}"})
+        # Bad records are the client's fault; only failures past this point are a 500
+        if not isinstance(pokemon['type'], str) or pokemon['type'].lower() not in TYPE_COLORS:
+            return self.send_json(400, {'error': f"unknown type {pokemon['type']!r}, expected one of "
+                                                 f"{', '.join(sorted(TYPE_COLORS))}"})
+        if not isinstance(pokemon['attacks'], list):
+            return self.send_json(400, {'error': "attacks must be a list"})
+        self.send_card(kind, pokemon, url.query)
+
+    def send_card(self, kind, pokemon, query):
+        encoder = parse_qs(query).get('encoder', [self.service.encoder])[0]
+        try:
+            spec = get_encoder(encoder)
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+
+        prepared = self.service.prepare(kind, pokemon, encoder)
+        etag = prepared[0]
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(self.headers.get('If-None-Match', ''), etag):
+            return self.send_bytes(304, None, headers)
+        try:
+            _, data = self.service.render(kind, pokemon, encoder, prepared)
+        except Exception as e:
+            return self.send_json(500, {'error': f"failed to render {pokemon['name']}: {e}"})
+        self.send_bytes(200, data, dict(headers, **{'Content-Type': spec['mime']}))
+
+    def send_json(self, status, payload):
+        self.send_bytes(status, json.dumps(payload).encode(), {'Content-Type': 'application/json'})
+
+    def send_bytes(self, status, data, headers):
+        self.send_response(status)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if data is not None:
+            self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if data is not None and self.command != 'HEAD':
+            self.wfile.write(data)
+
+
+def make_server(service, host='127.0.0.1', port=8765):
+    handler = type('Handler', (CardRequestHandler,), {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve card previews rendered on demand")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int, default=0, help="sparkle/texture seed, so a record always renders the same")
+    parser.add_argument('--encoder', choices=list(ENCODERS), default='png', help="default image format")
+    parser.add_argument('--cache-mb', type=int, default=RESPONSE_CACHE_MAX_BYTES // (1024 * 1024))
+    parser.add_argument('--no-prewarm', action='store_true', help="don't render the deck at startup")
+    args = parser.parse_args(argv)
+
+    pokemon_cards, shining_cards = load_cards()
+    cards = [('regular', pokemon) for pokemon in pokemon_cards] + [('shining', pokemon) for pokemon in shining_cards]
+    service = CardService(cards, seed=args.seed, encoder=args.encoder, cache_max_bytes=args.cache_mb * 1024 * 1024)
+    server = make_server(service, args.host, args.port)
+
+    if not args.no_prewarm:
+        # Serve right away; requests for cards not rendered yet just render on demand
+        threading.Thread(target=service.prewarm, daemon=True).start()
+
+    print(f"Serving cards on http://{args.host}:{server.server_port}/cards/<kind>/<name>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
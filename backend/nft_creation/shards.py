@@ -0,0 +1,124 @@
+import argparse
+import glob
+import hashlib
+import os
+import re
+
+from artwork import CARD_HEIGHT, CARD_WIDTH, card_filename
+from derivatives import DERIVATIVE_SIZES, parse_sizes, save_size_manifest, size_manifest_entry
+from encoders import ENCODERS
+from manifest import MANIFEST_NAME, load_manifest, remove_orphans, save_manifest, shard_manifest_name
+from render_state import state_dir
+
+_SHARD_MANIFEST = re.compile(r'^\.render_manifest\.shard-(\d+)-of-(\d+)\.json$')
+
+
+def parse_shard(spec):
+    """Parse ``I/N`` (shard I of N, counting from 1) into ``(I, N)``"""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, got {spec!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} is not between 1 and {count}")
+    return index, count
+
+
+def shard_of(kind, pokemon_name, count):
+    """The shard (1..count) a card belongs to
+
+    Hashes the card's identity rather than its position, so every node
+    agrees on the split and adding a card to the deck doesn't move others.
+    """
+    digest = hashlib.sha256(f"{kind}:{pokemon_name}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def select_shard(jobs, index, count):
+    """The ``(kind, pokemon, output_dir)`` jobs shard ``index`` of ``count`` renders"""
+    return [job for job in jobs if shard_of(job[0], job[1]['name'], count) == index]
+
+
+def merge_shards(jobs, count, encoder=None, derivatives=None, prune=False):
+    """Combine the shards' partial manifests into each output directory's manifest
+
+    Run once every shard's images have been gathered into the output
+    directories and its partial manifests into their state directories
+    (see render_state.py). A card no partial manifest lists is
+    reported missing along with the shard that should have rendered it; a
+    card listed by more than one is reported as a duplicate. Partial
+    manifests for a different shard count are reported as stale. The
+    merged manifest is written even when cards are missing, so an
+    ``--incremental`` run can fill them in. Returns ``{'missing',
+    'duplicates', 'stale'}`` lists.
+    """
+    report = {'missing': [], 'duplicates': [], 'stale': []}
+    expected = {}
+    for kind, pokemon, output_dir in jobs:
+        expected.setdefault(output_dir, {})[card_filename(pokemon, encoder)] = (kind, pokemon)
+
+    for output_dir, cards in expected.items():
+        for path in sorted(glob.glob(os.path.join(state_dir(output_dir), '.render_manifest.shard-*.json'))):
+            match = _SHARD_MANIFEST.match(os.path.basename(path))
+            if match and int(match.group(2)) != count:
+                report['stale'].append(path)
+
+        merged, owners = {}, {}
+        for index in range(1, count + 1):
+            for filename, fingerprint in load_manifest(output_dir, shard_manifest_name(index, count)).items():
+                if filename in owners:
+                    report['duplicates'].append({'file': os.path.join(output_dir, filename),
+                                                 'shards': [owners[filename], index],
+                                                 'same_fingerprint': merged[filename] == fingerprint})
+                    continue
+                owners[filename] = index
+                merged[filename] = fingerprint
+
+        for filename, (kind, pokemon) in sorted(cards.items()):
+            if filename not in merged or not os.path.isfile(os.path.join(output_dir, filename)):
+                report['missing'].append({'file': os.path.join(output_dir, filename), 'kind': kind,
+                                          'shard': shard_of(kind, pokemon['name'], count)})
+        # Cards outside the deck are left out of the manifest, and deleted with ``prune``
+        save_manifest(output_dir, {filename: merged[filename] for filename in cards if filename in merged})
+        if prune:
+            for path in remove_orphans(output_dir, set(cards)):
+                print(f"Removed orphaned card {path}")
+
+        if derivatives:
+            save_size_manifest(output_dir, {
+                pokemon['name']: size_manifest_entry(pokemon, output_dir, (CARD_WIDTH, CARD_HEIGHT),
+                                                     derivatives, encoder)
+                for filename, (_, pokemon) in cards.items() if filename in merged
+            })
+        print(f"Merged {len(merged)} of {len(cards)} cards into {os.path.join(state_dir(output_dir), MANIFEST_NAME)}")
+    return report
+
+
+def main(argv=None):
+    from populate import load_cards, regular_dir, shiny_dir
+
+    parser = argparse.ArgumentParser(description="Merge the partial manifests of a sharded render")
+    parser.add_argument('--shards', type=int, required=True, help="number of shards the deck was split into")
+    parser.add_argument('--encoder', choices=list(ENCODERS), default='png', help="format the shards rendered")
+    parser.add_argument('--derivatives', nargs='?', type=parse_sizes, metavar='NAME=WIDTH,...',
+                        const=DERIVATIVE_SIZES, help="also write the size manifests for these sizes")
+    parser.add_argument('--prune', action='store_true', help="delete card images that are not in the deck")
+    args = parser.parse_args(argv)
+
+    pokemon_cards, shining_cards = load_cards()
+    jobs = [('regular', pokemon, regular_dir) for pokemon in pokemon_cards]
+    jobs += [('shining', pokemon, shiny_dir) for pokemon in shining_cards]
+    report = merge_shards(jobs, args.shards, args.encoder, args.derivatives, args.prune)
+
+    for card in report['missing']:
+        print(f"Missing {card['kind']} card {card['file']} (shard {card['shard']}/{args.shards})")
+    for card in report['duplicates']:
+        detail = "same fingerprint" if card['same_fingerprint'] else "fingerprints differ"
+        print(f"Duplicate card {card['file']} from shards {card['shards'][0]} and {card['shards'][1]} ({detail})")
+    for path in report['stale']:
+        print(f"Ignored partial manifest for a different shard count: {path}")
+    return 1 if report['missing'] or report['duplicates'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+# Name -> official artwork table built from a PokeAPI dump. Override with POKEMON_SPECIES_INDEX.
+SPECIES_INDEX_PATH = os.environ.get(
+    'POKEMON_SPECIES_INDEX',
+    os.path.join(os.path.dirname(__file__), '.species_index.sqlite')
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS species (
+    name TEXT PRIMARY KEY,
+    id INTEGER,
+    front_default TEXT,
+    front_shiny TEXT,
+    default_path TEXT,
+    shiny_path TEXT
+)
+"""
+
+
+_UPSERT = """
+INSERT INTO species VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(name) DO UPDATE SET
+    id = COALESCE(excluded.id, id),
+    front_default = COALESCE(excluded.front_default, front_default),
+    front_shiny = COALESCE(excluded.front_shiny, front_shiny),
+    default_path = COALESCE(excluded.default_path, default_path),
+    shiny_path = COALESCE(excluded.shiny_path, shiny_path)
+"""
+
+
+def iter_species_json(source):
+    """Yield PokeAPI pokemon objects from a JSON file, a JSON Lines file or a directory tree of them
+
+    Works on the api-data dump (``data/api/v2/pokemon/<id>/index.json``)
+    as well as a flat directory of saved ``/pokemon/{name}`` responses.
+    Anything without a name and an official artwork URL is skipped, such as
+    the ``pokemon-form`` records found elsewhere under ``data/api/v2``.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for item in sorted(files):
+                if item.endswith(('.json', '.jsonl')):
+                    yield from iter_species_json(os.path.join(root, item))
+        return
+    with open(source, 'r') as f:
+        if source.endswith('.jsonl'):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            try:
+                records = json.load(f)
+            except ValueError:
+                return
+    for record in records if isinstance(records, list) else [records]:
+        if isinstance(record, dict) and 'name' in record and any(_official_artwork(record).values()):
+            yield record
+
+
+def _local_artwork(artwork_dir, pokemon_id, name, shiny):
+    """Find a downloaded artwork file, in the PokeAPI sprites layout (<id>.png, shiny/<id>.png) or by name"""
+    if not artwork_dir:
+        return None
+    directory = os.path.join(artwork_dir, 'shiny') if shiny else artwork_dir
+    for stem in (pokemon_id, name):
+        path = os.path.join(directory, f"{stem}.png")
+        if stem is not None and os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+
+def _official_artwork(data):
+    return ((data.get('sprites') or {}).get('other') or {}).get('official-artwork') or {}
+
+
+def species_row(data, artwork_dir=None):
+    artwork = _official_artwork(data)
+    name = data['name'].lower()
+    return (
+        name,
+        data.get('id'),
+        artwork.get('front_default'),
+        artwork.get('front_shiny'),
+        _local_artwork(artwork_dir, data.get('id'), name, False),
+        _local_artwork(artwork_dir, data.get('id'), name, True),
+    )
+
+
+class SpeciesIndex:
+    """On-disk sqlite table of species artwork, read into a dict on first lookup"""
+
+    def __init__(self, path=SPECIES_INDEX_PATH):
+        self.path = path
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute(_SCHEMA)
+        return connection
+
+    def import_species(self, records, artwork_dir=None):
+        """Insert or update the artwork of every PokeAPI pokemon object in ``records``
+
+        A record missing a URL or local file keeps the one already indexed,
+        so a later, sparser record never blanks out a species.
+        """
+        rows = [species_row(record, artwork_dir) for record in records]
+        with self._connect() as connection:
+            connection.executemany(_UPSERT, rows)
+        connection.close()
+        with self._lock:
+            self._entries = None
+        return len(rows)
+
+    def _load(self):
+        with self._lock:
+            if self._entries is None:
+                connection = self._connect()
+                rows = connection.execute("SELECT * FROM species").fetchall()
+                connection.close()
+                self._entries = {row[0]: row for row in rows}
+            return self._entries
+
+    def __len__(self):
+        return len(self._load())
+
+    def artwork(self, pokemon_name, shiny=False):
+        """Return ``(url, local path)`` for a Pokemon's official artwork, or None if it isn't indexed"""
+        row = self._load().get(pokemon_name.lower())
+        if row is None:
+            return None
+        _, _, front_default, front_shiny, default_path, shiny_path = row
+        url, path = (front_shiny, shiny_path) if shiny else (front_default, default_path)
+        if path and not os.path.isfile(path):
+            path = None
+        return (url, path) if url or path else None
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_species_index():
+    """The index at SPECIES_INDEX_PATH, or None until one has been imported"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None and os.path.isfile(SPECIES_INDEX_PATH):
+            _default_index = SpeciesIndex(SPECIES_INDEX_PATH)
+        return _default_index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the local species artwork index from a PokeAPI dump")
+    parser.add_argument('--index', default=SPECIES_INDEX_PATH, help="sqlite file to write")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    importer = subparsers.add_parser('import', help="add species from PokeAPI JSON files or directories")
+    importer.add_argument('sources', nargs='+', metavar='PATH')
+    importer.add_argument('--artwork-dir', metavar='DIR',
+                          help="downloaded official artwork (<id>.png and shiny/<id>.png)")
+
+    lookup = subparsers.add_parser('lookup', help="show the indexed artwork for Pokemon names")
+    lookup.add_argument('names', nargs='+')
+    args = parser.parse_args(argv)
+
+    index = SpeciesIndex(args.index)
+    if args.command == 'import':
+        for source in args.sources:
+            count = index.import_species(iter_species_json(source), args.artwork_dir)
+            print(f"Imported {count} species from {source}")
+        print(f"{len(index)} species in {args.index}")
+    else:
+        for name in args.names:
+            for shiny in (False, True):
+                print(f"{name}{' (shiny)' if shiny else ''}: {index.artwork(name, shiny)}")
+
+
+if __name__ == "__main__":
+    main()
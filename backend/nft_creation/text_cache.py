@@ -0,0 +1,78 @@
+from collections import OrderedDict
+import functools
+import math
+import threading
+
+from PIL import Image, ImageDraw
+
+from instrumentation import count
+
+# Rasterized labels kept for reuse; attack names, damage numbers and stat
+# labels recur across a deck, so a few thousand cover every card
+TEXT_SPRITE_CACHE_SIZE = 4096
+# Blank border around each sprite so subpixel offsets never clip a glyph
+_PAD = 2
+
+_sprites = OrderedDict()
+_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+
+
+def _build_sprite(text, font, frac_x, frac_y):
+    left, top, right, bottom = font.getbbox(text)
+    origin_x, origin_y = _PAD - left, _PAD - top
+    mask = Image.new('L', (right - left + 2 * _PAD + 1, bottom - top + 2 * _PAD + 1), 0)
+    ImageDraw.Draw(mask).text((origin_x + frac_x, origin_y + frac_y), text, font=font, fill=255)
+    return mask, origin_x, origin_y
+
+
+def draw_text(img, xy, text, font, fill):
+    """``ImageDraw.Draw(img).text(xy, text, font=font, fill=fill)`` from a cached alpha mask
+
+    The mask is rasterized once per (text, font, subpixel offset) and pasted
+    with ``fill`` at the integer position, which gives the same pixels as
+    drawing the text directly.
+    """
+    x, y = xy
+    frac_x, frac_y = math.modf(x)[0], math.modf(y)[0]
+    key = (text, font, frac_x, frac_y)
+    with _lock:
+        sprite = _sprites.get(key)
+        if sprite is not None:
+            _sprites.move_to_end(key)
+            _stats['hits'] += 1
+        else:
+            _stats['misses'] += 1
+    if sprite is None:
+        count('text_sprite_misses')
+        sprite = _build_sprite(text, font, frac_x, frac_y)
+        with _lock:
+            _sprites[key] = sprite
+            while len(_sprites) > TEXT_SPRITE_CACHE_SIZE:
+                _sprites.popitem(last=False)
+    else:
+        count('text_sprite_hits')
+    mask, origin_x, origin_y = sprite
+    img.paste(fill, (int(x) - origin_x, int(y) - origin_y), mask)
+
+
+@functools.lru_cache(maxsize=TEXT_SPRITE_CACHE_SIZE)
+def text_length(font, text):
+    """Memoized ``font.getlength(text)``"""
+    return font.getlength(text)
+
+
+def text_cache_info():
+    """Entries and hit/miss counts of the sprite and text width caches"""
+    with _lock:
+        info = dict(_stats, entries=len(_sprites), max_entries=TEXT_SPRITE_CACHE_SIZE)
+    lengths = text_length.cache_info()
+    info.update(length_hits=lengths.hits, length_misses=lengths.misses)
+    return info
+
+
+def clear_text_cache():
+    with _lock:
+        _sprites.clear()
+        _stats.update(hits=0, misses=0)
+    text_length.cache_clear()
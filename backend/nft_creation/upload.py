@@ -0,0 +1,403 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from encoders import ENCODERS, get_encoder, image_filename
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../src/data')
+MAPPINGS_PATH = os.path.join(DATA_DIR, 'mappings.json')
+METADATA_DIR = os.path.join(os.path.dirname(__file__), '../../public/metadata')
+# mappings.json section per card kind
+MAPPING_SECTIONS = {'regular': 'pokemon', 'shining': 'shining'}
+
+CHUNK_SIZE = 256 * 1024
+CHUNK_RETRIES = 3
+REQUEST_TIMEOUT = 30
+# Save mappings.json after this many published cards, so a crash loses little paid work
+SAVE_EVERY = 25
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def mapping_name(kind, pokemon):
+    """The card's name in mappings.json; shining entries carry the "Shining" prefix"""
+    name = pokemon['name']
+    if kind == 'shining' and not name.startswith('Shining '):
+        return f"Shining {name}"
+    return name
+
+
+def load_mappings(path=MAPPINGS_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except OSError:
+        return {section: [] for section in MAPPING_SECTIONS.values()}
+
+
+def save_mappings(mappings, path=MAPPINGS_PATH):
+    """Write mappings.json through a temp file and rename, so readers never see half of it"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(mappings, f, indent=3)
+    os.replace(tmp_path, path)
+
+
+def published_metadata(metadata, image_link):
+    """The metadata as uploaded: the local file with its image pointing at the uploaded image"""
+    metadata = json.loads(json.dumps(metadata))
+    metadata['image'] = image_link
+    for entry in metadata.get('properties', {}).get('files', [])[:1]:
+        entry['uri'] = image_link
+    return json.dumps(metadata, indent=2).encode()
+
+
+class FilesystemBackend:
+    """Content-addressed blob store in a local directory, standing in for permanent storage"""
+
+    def __init__(self, root, base_url=None):
+        self.root = root
+        self.base_url = base_url or f"file://{os.path.abspath(root)}"
+        os.makedirs(root, exist_ok=True)
+
+    def upload(self, data, content_type):
+        digest = sha256(data)
+        path = os.path.join(self.root, digest)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with open(f"{path}.type", 'w') as f:
+                f.write(content_type)
+        return f"{self.base_url}/{digest}"
+
+
+class HTTPBackend:
+    """Chunked uploads to an HTTP endpoint, such as the stub from ``upload.py serve-stub``
+
+    An upload is opened with ``POST /uploads``. Its chunks are then sent
+    with ``PUT /uploads/<id>/<n>``, and ``POST /uploads/<id>/complete``
+    returns the permanent URI. A failed chunk is retried on its own,
+    without resending the rest of the file.
+    """
+
+    def __init__(self, endpoint, chunk_size=CHUNK_SIZE, retries=CHUNK_RETRIES, timeout=REQUEST_TIMEOUT):
+        self.endpoint = endpoint.rstrip('/')
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # Imported on first upload so planning never loads requests; one session per thread
+        if not hasattr(self._local, 'session'):
+            import requests
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _request(self, method, url, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                response.raise_for_status()
+                return response
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def upload(self, data, content_type):
+        upload = self._request('POST', f"{self.endpoint}/uploads", json={
+            'size': len(data), 'sha256': sha256(data), 'content_type': content_type,
+        }).json()
+        for number, offset in enumerate(range(0, len(data), self.chunk_size)):
+            self._request('PUT', f"{self.endpoint}/uploads/{upload['id']}/{number}",
+                          data=data[offset:offset + self.chunk_size])
+        return self._request('POST', f"{self.endpoint}/uploads/{upload['id']}/complete").json()['uri']
+
+
+BACKENDS = {
+    'filesystem': FilesystemBackend,
+    'http': HTTPBackend,
+}
+
+
+def plan_uploads(jobs, mappings, metadata_dirs, encoder=None, include_untracked=False):
+    """Compare the rendered cards and metadata with mappings.json and decide what to upload
+
+    ``jobs`` are ``(kind, pokemon, output_dir)`` as for render_batch. Each
+    card gets one of these statuses:
+
+    - ``new``: no metadata link is recorded for it;
+    - ``changed``: its image or published metadata hash differs from the
+      recorded one;
+    - ``unchanged``: both hashes match;
+    - ``untracked``: it has a link but no hashes (published before hashes
+      were recorded), and is only uploaded with ``include_untracked``;
+    - ``missing``: its image or metadata hasn't been rendered.
+
+    Returns the plan, one dict per card, with ``upload_image`` and
+    ``upload_metadata`` set for the assets that need uploading.
+    """
+    entries = {
+        (kind, entry['name']): entry
+        for kind, section in MAPPING_SECTIONS.items() for entry in mappings.get(section, [])
+    }
+    plan = []
+    for kind, pokemon, output_dir in jobs:
+        name = mapping_name(kind, pokemon)
+        entry = entries.get((kind, name), {})
+        card = {
+            'kind': kind,
+            'name': name,
+            'image_path': os.path.join(output_dir, image_filename(pokemon['name'], encoder)),
+            'metadata_path': os.path.join(metadata_dirs[kind], f"{pokemon['name']}_metadata.json"),
+            'upload_image': False,
+            'upload_metadata': False,
+            'bytes': 0,
+        }
+        plan.append(card)
+        if not os.path.isfile(card['image_path']) or not os.path.isfile(card['metadata_path']):
+            card['status'] = 'missing'
+            continue
+        with open(card['image_path'], 'rb') as f:
+            image_bytes = f.read()
+        with open(card['metadata_path'], 'r') as f:
+            card['metadata'] = json.load(f)
+        card['image_sha256'] = sha256(image_bytes)
+
+        if not entry.get('metadata_link'):
+            card['status'] = 'new'
+        elif 'image_sha256' not in entry or 'metadata_sha256' not in entry:
+            card['status'] = 'untracked'
+        else:
+            image_changed = entry['image_sha256'] != card['image_sha256']
+            metadata_changed = sha256(published_metadata(card['metadata'], entry['image_link'])) \
+                != entry['metadata_sha256']
+            card['status'] = 'changed' if image_changed or metadata_changed else 'unchanged'
+            card['upload_image'] = image_changed
+
+        if card['status'] in ('new', 'changed') or (card['status'] == 'untracked' and include_untracked):
+            card['upload_image'] = card['upload_image'] or card['status'] != 'changed'
+            card['upload_metadata'] = True
+            card['image_link'] = entry.get('image_link')
+            card['bytes'] = (len(image_bytes) if card['upload_image'] else 0) + os.path.getsize(card['metadata_path'])
+    return plan
+
+
+def print_plan(plan):
+    statuses = ('new', 'changed', 'unchanged', 'untracked', 'missing')
+    counts = {status: sum(1 for card in plan if card['status'] == status) for status in statuses}
+    uploads = [card for card in plan if card['upload_metadata']]
+    for card in uploads:
+        assets = 'image and metadata' if card['upload_image'] else 'metadata'
+        print(f"  {card['status']:>9}  {card['name']} ({card['kind']}): {assets}, {card['bytes']} bytes")
+    for card in plan:
+        if card['status'] == 'missing':
+            print(f"  {'missing':>9}  {card['name']} ({card['kind']}): not rendered, skipped")
+    print(', '.join(f"{counts[status]} {status}" for status in statuses))
+    print(f"{len(uploads)} cards to upload, {sum(card['bytes'] for card in uploads)} bytes")
+
+
+def publish_card(card, backend, encoder=None):
+    """Upload a planned card's image (if it changed) and metadata; return its new mappings entry"""
+    image_link = card['image_link']
+    if card['upload_image'] or not image_link:
+        with open(card['image_path'], 'rb') as f:
+            image_link = backend.upload(f.read(), get_encoder(encoder)['mime'])
+    metadata = published_metadata(card['metadata'], image_link)
+    return {
+        'name': card['name'],
+        'metadata_link': backend.upload(metadata, 'application/json'),
+        'image_link': image_link,
+        'image_sha256': card['image_sha256'],
+        'metadata_sha256': sha256(metadata),
+    }
+
+
+def run_uploads(plan, backend, mappings, mappings_path=MAPPINGS_PATH, concurrency=4, encoder=None):
+    """Publish every card the plan uploads, ``concurrency`` at a time, recording each in mappings.json
+
+    mappings.json is rewritten atomically every SAVE_EVERY cards and once
+    more at the end, even if uploads fail. Returns the cards that failed.
+    """
+    sections = {kind: mappings.setdefault(section, []) for kind, section in MAPPING_SECTIONS.items()}
+    positions = {(kind, entry['name']): i for kind, entries in sections.items() for i, entry in enumerate(entries)}
+    uploads = [card for card in plan if card['upload_metadata']]
+    failed = []
+    published = 0
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(publish_card, card, backend, encoder): card for card in uploads}
+            for future in as_completed(futures):
+                card = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    print(f"Failed to upload {card['name']} ({card['kind']}): {e}")
+                    failed.append(card)
+                    continue
+                key = (card['kind'], card['name'])
+                if key in positions:
+                    # Keep any other fields an entry has, e.g. ones added by hand
+                    sections[card['kind']][positions[key]].update(entry)
+                else:
+                    positions[key] = len(sections[card['kind']])
+                    sections[card['kind']].append(entry)
+                published += 1
+                print(f"Uploaded {card['name']} ({card['kind']}): {entry['metadata_link']}")
+                if published % SAVE_EVERY == 0:
+                    save_mappings(mappings, mappings_path)
+    finally:
+        save_mappings(mappings, mappings_path)
+    print(f"\nUploaded {published} cards in {time.perf_counter() - start:.2f}s"
+          f"{f', {len(failed)} failed' if failed else ''}; mappings saved to {mappings_path}")
+    return failed
+
+
+class StubUploadHandler(BaseHTTPRequestHandler):
+    """Accepts chunked uploads as HTTPBackend sends them and stores them in a FilesystemBackend"""
+
+    store = None
+    pending = {}
+    lock = threading.Lock()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        parts = self.path.strip('/').split('/')
+        if parts == ['uploads']:
+            request = json.loads(self._body() or b'{}')
+            upload_id = uuid.uuid4().hex
+            with self.lock:
+                self.pending[upload_id] = dict(request, chunks={})
+            return self._send_json(201, {'id': upload_id})
+        if len(parts) == 3 and parts[0] == 'uploads' and parts[2] == 'complete':
+            with self.lock:
+                upload = self.pending.pop(parts[1], None)
+            if upload is None:
+                return self._send_json(404, {'error': 'unknown upload'})
+            data = b''.join(upload['chunks'][number] for number in sorted(upload['chunks']))
+            if len(data) != upload.get('size', len(data)) or sha256(data) != upload.get('sha256', sha256(data)):
+                return self._send_json(422, {'error': 'upload does not match its size and sha256'})
+            uri = self.store.upload(data, upload.get('content_type', 'application/octet-stream'))
+            return self._send_json(200, {'uri': uri})
+        self._send_json(404, {'error': 'not found'})
+
+    def do_PUT(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != 'uploads' or not parts[2].isdigit():
+            return self._send_json(404, {'error': 'not found'})
+        data = self._body()
+        with self.lock:
+            upload = self.pending.get(parts[1])
+            if upload is not None:
+                upload['chunks'][int(parts[2])] = data
+        if upload is None:
+            return self._send_json(404, {'error': 'unknown upload'})
+        self._send_json(200, {'received': len(data)})
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        path = os.path.join(self.store.root, parts[-1]) if len(parts) == 2 and parts[0] == 'blobs' else None
+        if path is None or not os.path.isfile(path):
+            return self._send_json(404, {'error': 'not found'})
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(f"{path}.type", 'r') as f:
+            content_type = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_stub_server(root, host='127.0.0.1', port=8765):
+    """An HTTP upload stub storing blobs under ``root`` and serving them from /blobs/<sha256>"""
+    server = ThreadingHTTPServer((host, port), StubUploadHandler)
+    host, port = server.server_address[:2]
+    handler = type('StubUploadHandler', (StubUploadHandler,), {
+        'store': FilesystemBackend(root, f"http://{host}:{port}/blobs"),
+        'pending': {},
+        'lock': threading.Lock(),
+    })
+    server.RequestHandlerClass = handler
+    return server
+
+
+def main(argv=None):
+    from populate import load_cards, regular_dir, shiny_dir
+
+    parser = argparse.ArgumentParser(description="Upload new and changed cards and record them in mappings.json")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('plan', "show what would be uploaded"), ('upload', "upload and update mappings.json")):
+        command = subparsers.add_parser(name, help=help_text)
+        command.add_argument('--mappings', default=MAPPINGS_PATH)
+        command.add_argument('--metadata-dir', default=METADATA_DIR)
+        command.add_argument('--encoder', choices=list(ENCODERS), default='png',
+                             help="format the cards were rendered in")
+        command.add_argument('--include-untracked', action='store_true',
+                             help="re-upload cards recorded before content hashes were kept")
+    upload = subparsers.choices['upload']
+    upload.add_argument('--backend', choices=list(BACKENDS), default='filesystem')
+    upload.add_argument('--target', required=True,
+                        help="directory for the filesystem backend, endpoint URL for the http backend")
+    upload.add_argument('--concurrency', type=int, default=4, help="cards uploading at once")
+    stub = subparsers.add_parser('serve-stub', help="run a local HTTP upload endpoint for testing")
+    stub.add_argument('root', help="directory to store uploaded blobs in")
+    stub.add_argument('--host', default='127.0.0.1')
+    stub.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve-stub':
+        server = make_stub_server(args.root, args.host, args.port)
+        print(f"Upload stub listening on http://{args.host}:{server.server_address[1]}, storing in {args.root}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    pokemon_cards, shining_cards = load_cards()
+    jobs = [('regular', pokemon, regular_dir) for pokemon in pokemon_cards]
+    jobs += [('shining', pokemon, shiny_dir) for pokemon in shining_cards]
+    metadata_dirs = {'regular': args.metadata_dir, 'shining': os.path.join(args.metadata_dir, 'shiny')}
+    mappings = load_mappings(args.mappings)
+    plan = plan_uploads(jobs, mappings, metadata_dirs, args.encoder, args.include_untracked)
+    print_plan(plan)
+    if args.command == 'plan':
+        return 0
+
+    backend = BACKENDS[args.backend](args.target)
+    failed = run_uploads(plan, backend, mappings, args.mappings, args.concurrency, args.encoder)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())